@@ -0,0 +1,14 @@
+from django.urls import path
+from . import async_views
+
+urlpatterns = [
+    path('me/', async_views.me, name='api_async_me'),
+    path('subjects/', async_views.subjects, name='api_async_subjects'),
+    path('my-subjects/', async_views.my_subjects, name='api_async_my_subjects'),
+
+    path('bookings/request/', async_views.request_booking, name='api_async_request_booking'),
+    path('bookings/mine/', async_views.my_bookings, name='api_async_my_bookings'),
+    path('bookings/bulk-status/', async_views.bulk_status, name='api_async_bulk_booking_status'),
+    path('bookings/<int:booking_id>/approve/', async_views.approve_booking, name='api_async_approve_booking'),
+    path('bookings/<int:booking_id>/reject/', async_views.reject_booking, name='api_async_reject_booking'),
+]
@@ -0,0 +1,184 @@
+# api/async_views.py
+"""Async twins of the read endpoints and booking actions, served under /api/async/.
+
+They use the async ORM (``aget``, async iteration) so an ASGI worker can
+keep many slow requests in flight on one event loop. Writes that need a
+transaction and row locks (``book_lesson``, ``set_pending_status``,
+subject selection) still run as sync service calls via ``sync_to_async``,
+because the async ORM has no transaction support. Payloads match the sync
+views in api/views.py and api/bookings.py.
+"""
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from bookings.models import LessonBooking, TeacherAvailability
+from bookings.services import BookingError, book_lesson, set_pending_status
+from core.pagination import InvalidCursor, akeyset_page
+from core.roles import aget_role_names
+from subjects.catalog import get_catalog
+from subjects.models import UserSubject
+from subjects.services import set_student_subjects
+
+from .bookings import MAX_BULK_IDS, booking_to_dict, lesson_hours, lesson_times, my_bookings_query
+from .conditional import conditional_on_versions, etag_matches, user_and_catalog_versions, user_version
+from .views import CATALOG_CACHE_CONTROL
+
+
+def alogin_required(view):
+    """Reject anonymous requests the way DRF's ``IsAuthenticated`` does."""
+    @wraps(view)
+    async def wrapped(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapped
+
+
+async def ais_teacher_or_admin(user):
+    return user.is_staff or "teacher" in await aget_role_names(user)
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+async def abooking_dict(booking_id):
+    booking = await LessonBooking.objects.select_related('student', 'teacher', 'subject').aget(id=booking_id)
+    return booking_to_dict(booking)
+
+
+@require_GET
+@alogin_required
+@conditional_on_versions(user_version)
+async def me(request):
+    return JsonResponse({"id": request.user.id, "username": request.user.username})
+
+
+@require_GET
+@alogin_required
+async def subjects(request):
+    catalog = await sync_to_async(get_catalog)()
+    if etag_matches(request, catalog.etag):
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(catalog.as_list(), safe=False)
+    response['ETag'] = catalog.etag
+    response['Cache-Control'] = CATALOG_CACHE_CONTROL
+    return response
+
+
+@require_http_methods(['GET', 'POST'])
+@alogin_required
+@conditional_on_versions(user_and_catalog_versions)
+async def my_subjects(request):
+    if request.method == 'POST':
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        ids = data.getlist('subject_ids') if hasattr(data, 'getlist') else data.get('subject_ids', [])
+        try:
+            await sync_to_async(set_student_subjects)(request.user, ids)
+        except ValidationError as e:
+            return JsonResponse({"error": e.messages[0]}, status=400)
+    mine = [{"id": us.subject.id, "code": us.subject.code, "name": us.subject.name}
+            async for us in UserSubject.objects.filter(user=request.user).select_related('subject')]
+    return JsonResponse(mine, safe=False)
+
+
+@require_GET
+@alogin_required
+@conditional_on_versions(user_and_catalog_versions)
+async def my_bookings(request):
+    params = request.GET
+    try:
+        qs, page_size = my_bookings_query(request.user, params, await ais_teacher_or_admin(request.user))
+        items, next_cursor = await akeyset_page(qs, 'created_at', params.get('cursor'), page_size)
+    except (ValueError, InvalidCursor) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"results": [booking_to_dict(b) for b in items], "next_cursor": next_cursor})
+
+
+@require_POST
+@alogin_required
+async def request_booking(request):
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    try:
+        availability = await (TeacherAvailability.objects.select_related('teacher', 'subject')
+                              .aget(id=data.get('availability_id')))
+    except (TeacherAvailability.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({"error": "Availability not found"}, status=404)
+    try:
+        start, end = lesson_times(availability, data.get('start'), lesson_hours(data.get('duration', 1)))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    try:
+        booking = await sync_to_async(book_lesson)(request.user, availability.teacher, availability.subject,
+                                                   start, end)
+    except BookingError as e:
+        return JsonResponse({"error": str(e)}, status=e.status_code)
+    return JsonResponse(await abooking_dict(booking.id), status=201)
+
+
+async def _single_status_change(request, booking_id, new_status, verb):
+    if not await ais_teacher_or_admin(request.user):
+        return JsonResponse({"error": "Not allowed"}, status=403)
+    outcome = (await sync_to_async(set_pending_status)(request.user, [booking_id], new_status))[booking_id]
+    if outcome == 'not_found':
+        return JsonResponse({"error": "Booking not found"}, status=404)
+    if outcome == 'forbidden':
+        return JsonResponse({"error": "Not allowed"}, status=403)
+    if outcome == 'not_pending':
+        return JsonResponse({"error": f"Only pending bookings can be {verb}"}, status=400)
+    return JsonResponse(await abooking_dict(booking_id))
+
+
+@require_POST
+@alogin_required
+async def approve_booking(request, booking_id):
+    return await _single_status_change(request, booking_id, 'approved', 'approved')
+
+
+@require_POST
+@alogin_required
+async def reject_booking(request, booking_id):
+    return await _single_status_change(request, booking_id, 'rejected', 'rejected')
+
+
+@require_POST
+@alogin_required
+async def bulk_status(request):
+    if not await ais_teacher_or_admin(request.user):
+        return JsonResponse({"error": "Not allowed"}, status=403)
+    data = request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    new_status = data.get('status')
+    if new_status not in ('approved', 'rejected'):
+        return JsonResponse({"error": "status must be 'approved' or 'rejected'"}, status=400)
+    ids = data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return JsonResponse({"error": "ids must be a non-empty list"}, status=400)
+    if len(ids) > MAX_BULK_IDS:
+        return JsonResponse({"error": f"At most {MAX_BULK_IDS} ids per request"}, status=400)
+    try:
+        outcomes = await sync_to_async(set_pending_status)(request.user, ids, new_status)
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "ids must be integers"}, status=400)
+    return JsonResponse({
+        "updated": sum(1 for o in outcomes.values() if o == 'updated'),
+        "results": [{"id": pk, "result": outcome} for pk, outcome in sorted(outcomes.items())],
+    })
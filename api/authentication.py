@@ -0,0 +1,124 @@
+"""Signed bearer tokens for API clients that don't keep a session cookie.
+
+``POST /api/token/`` trades a username and password for a short-lived
+access token and a longer-lived refresh token; ``POST /api/token/refresh/``
+trades the refresh token for a new pair. Both are ``django.core.signing``
+payloads (HMAC-SHA256, timestamped). The access token carries the user id,
+username, staff flag and role names, so ``SignedTokenAuthentication``
+builds ``request.user`` from it without touching the database or cache.
+
+An access token can't be revoked before it expires
+(``API_ACCESS_TOKEN_SECONDS``). Refresh tokens are checked against the
+database, and a password change or deactivation voids them.
+
+Key rotation: ``API_TOKEN_KEYS`` lists signing keys, newest first. New
+tokens are signed with the first; every key still verifies. To rotate, put
+the new key in front and drop the old one after ``API_REFRESH_TOKEN_SECONDS``.
+Without the setting, ``SECRET_KEY`` and ``SECRET_KEY_FALLBACKS`` are used.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.roles import get_role_names
+
+User = get_user_model()
+
+TOKEN_SALT = "api.authentication.token"
+ACCESS = "access"
+REFRESH = "refresh"
+
+
+class TokenError(Exception):
+    pass
+
+
+def signing_keys():
+    keys = list(getattr(settings, "API_TOKEN_KEYS", None) or ())
+    return keys or [settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+
+
+def lifetime(kind):
+    if kind == ACCESS:
+        return getattr(settings, "API_ACCESS_TOKEN_SECONDS", 900)
+    return getattr(settings, "API_REFRESH_TOKEN_SECONDS", 14 * 24 * 3600)
+
+
+def _sign(claims):
+    return signing.dumps(claims, key=signing_keys()[0], salt=TOKEN_SALT)
+
+
+def read_token(token, kind):
+    """The claims of a valid, unexpired ``kind`` token; raises ``TokenError``."""
+    keys = signing_keys()
+    try:
+        claims = signing.loads(token or "", key=keys[0], fallback_keys=keys[1:], salt=TOKEN_SALT,
+                               max_age=lifetime(kind))
+    except signing.SignatureExpired:
+        raise TokenError("Token has expired.")
+    except signing.BadSignature:
+        raise TokenError("Token is invalid.")
+    if claims.get("t") != kind:
+        raise TokenError("Token is invalid.")
+    return claims
+
+
+def issue_tokens(user):
+    """A fresh access and refresh token for ``user``, as the token endpoints return them."""
+    access = {"t": ACCESS, "u": user.pk, "n": user.get_username(), "s": user.is_staff,
+              "r": sorted(get_role_names(user))}
+    # the session auth hash changes with the password, which voids the refresh token
+    refresh = {"t": REFRESH, "u": user.pk, "h": user.get_session_auth_hash()}
+    return {"token_type": "Bearer", "access": _sign(access), "refresh": _sign(refresh),
+            "expires_in": lifetime(ACCESS)}
+
+
+def refresh_user(token):
+    """The active user a refresh token was issued to; raises ``TokenError``."""
+    claims = read_token(token, REFRESH)
+    user = User._default_manager.filter(pk=claims["u"], is_active=True).first()
+    if user is None:
+        raise TokenError("Token is invalid.")
+    hashes = [user.get_session_auth_hash(), *user.get_session_auth_fallback_hash()]
+    if not any(constant_time_compare(claims.get("h", ""), h) for h in hashes):
+        raise TokenError("Token is invalid.")
+    return user
+
+
+def token_user(claims):
+    """A ``User`` built from access token claims, without a query.
+
+    Only the id, username, staff flag and roles are filled in; it is for
+    filtering and permission checks, never for ``save()``.
+    """
+    user = User(pk=claims["u"], is_staff=claims["s"], is_active=True)
+    setattr(user, User.USERNAME_FIELD, claims["n"])
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    user.role_names = frozenset(claims["r"])
+    return user
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """``Authorization: Bearer <access token>``; see the module docstring."""
+
+    keyword = b"bearer"
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword:
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed("Invalid bearer token header.")
+        try:
+            claims = read_token(header[1].decode("latin-1"), ACCESS)
+        except TokenError as e:
+            raise AuthenticationFailed(str(e))
+        return token_user(claims), claims
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
@@ -2,19 +2,101 @@
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 from django.contrib.auth.models import Group
 from bookings.models import LessonBooking, TeacherAvailability
+from bookings.services import MIN_NOTICE, BookingError, book_lesson, set_pending_status
+from bookings.slots import ceil_to, free_slots, occurrence, open_slots
 from rest_framework import status
+from core.pagination import InvalidCursor, keyset_page
+from core.roles import is_teacher
+from .conditional import conditional_on_versions, user_and_catalog_versions
 
-def is_teacher(user):
-    return user.groups.filter(name="teacher").exists()
+PAGE_SIZE = getattr(settings, "API_PAGE_SIZE", 50)
+MAX_PAGE_SIZE = getattr(settings, "API_MAX_PAGE_SIZE", 200)
+MAX_SLOT_RANGE_DAYS = getattr(settings, "MAX_SLOT_RANGE_DAYS", 62)
+SLOT_STEP = timedelta(minutes=15)
+MAX_SLOT_HOURS = 24
+MAX_BULK_IDS = 200
 
 def is_admin(user):
     # using Django staff as "admin" here; you can switch to a group if you prefer
     return user.is_staff
 
+def parse_when(value, end_of_day=False):
+    """Accept an ISO datetime or a plain date; returns an aware datetime or None."""
+    try:
+        d = parse_date(value)
+        dt = datetime.combine(d, time.max if end_of_day else time.min) if d else parse_datetime(value)
+    except ValueError:
+        return None
+    if dt is None:
+        return None
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+def lesson_hours(value):
+    """A booking's ``duration`` as whole hours; raises ``ValueError`` with a client-facing message."""
+    try:
+        hours = float(value)
+    except (TypeError, ValueError):
+        hours = None
+    if hours is None or not hours.is_integer() or not 0 < hours <= MAX_SLOT_HOURS:  # is_integer() is false for nan/inf
+        raise ValueError(f"duration must be a whole number of hours from 1 to {MAX_SLOT_HOURS}")
+    return int(hours)
+
+def lesson_times(availability, start=None, duration=1):
+    """``(start, end)`` for a lesson of ``duration`` hours in ``availability``.
+
+    ``start`` is an ISO datetime that must fall inside one of its windows;
+    without it the next occurrence of the availability's weekday is used.
+    Raises ``ValueError`` with a client-facing message.
+    """
+    if start:
+        start_dt = parse_when(start)
+        if start_dt is None:
+            raise ValueError("Invalid 'start' datetime")
+        end_dt = start_dt + timedelta(hours=duration)
+        local_day = timezone.localtime(start_dt).date()
+        window_start, window_end = occurrence(availability, local_day)
+        if local_day.weekday() != availability.weekday or start_dt < window_start or end_dt > window_end:
+            raise ValueError("Requested time is outside the teacher's availability")
+        return start_dt, end_dt
+    # next occurrence of that weekday
+    today = timezone.now().date()
+    days_ahead = (availability.weekday - today.weekday()) % 7
+    start_date = today + timedelta(days=days_ahead)
+    start_dt = timezone.make_aware(datetime.combine(start_date, availability.start_time))
+    return start_dt, start_dt + timedelta(hours=duration)
+
+def my_bookings_query(user, params, teacher):
+    """Filtered bookings queryset and page size for ``my_bookings``.
+
+    ``teacher`` picks the teacher's side. Raises ``ValueError`` with a
+    client-facing message on bad parameters.
+    """
+    qs = LessonBooking.objects.filter(teacher=user) if teacher else LessonBooking.objects.filter(student=user)
+    status_filter = params.get('status')
+    if status_filter:
+        if status_filter not in dict(LessonBooking.STATUS_CHOICES):
+            raise ValueError("Unknown status")
+        qs = qs.filter(status=status_filter)
+    for param, lookup, end_of_day in (('from', 'start_datetime__gte', False), ('to', 'start_datetime__lte', True)):
+        if params.get(param):
+            when = parse_when(params[param], end_of_day=end_of_day)
+            if when is None:
+                raise ValueError(f"Invalid '{param}' date")
+            qs = qs.filter(**{lookup: when})
+    try:
+        page_size = min(max(int(params.get('page_size', PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("page_size must be an integer")
+    return qs.select_related('student', 'teacher', 'subject'), page_size
+
 def booking_to_dict(b: LessonBooking):
     return {
         "id": b.id,
@@ -30,84 +112,178 @@ def booking_to_dict(b: LessonBooking):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def request_booking(request):
-    """Student requests a booking with a teacher availability"""
+    """Student requests a booking with a teacher availability.
+
+    ``start`` (ISO datetime, e.g. from /api/slots/) picks the lesson start;
+    without it the next occurrence of the availability's weekday is used.
+    """
     user = request.user
     availability_id = request.data.get('availability_id')
-    duration = int(request.data.get('duration', 1))  # hours
 
     try:
-        availability = TeacherAvailability.objects.get(id=availability_id)
+        availability = TeacherAvailability.objects.select_related('teacher', 'subject').get(id=availability_id)
     except TeacherAvailability.DoesNotExist:
         return Response({"error": "Availability not found"}, status=404)
 
-    # next occurrence of that weekday
-    today = timezone.now().date()
-    days_ahead = (availability.weekday - today.weekday()) % 7
-    start_date = today + timedelta(days=days_ahead)
-    start_dt = timezone.make_aware(datetime.combine(start_date, availability.start_time))
-    end_dt = start_dt + timedelta(hours=duration)
-
-    # 24h rule
-    if start_dt < timezone.now() + timedelta(hours=24):
-        return Response({"error": "Must book at least 24h in advance"}, status=400)
-
-    booking = LessonBooking.objects.create(
-        student=user,
-        teacher=availability.teacher,
-        subject=availability.subject,
-        start_datetime=start_dt,
-        end_datetime=end_dt,
-        status='pending',
-    )
+    try:
+        start_dt, end_dt = lesson_times(availability, request.data.get('start'),
+                                        lesson_hours(request.data.get('duration', 1)))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # 24h rule + overlap check run under the teacher lock
+    try:
+        booking = book_lesson(user, availability.teacher, availability.subject, start_dt, end_dt)
+    except BookingError as e:
+        return Response({"error": str(e)}, status=e.status_code)
     return Response(booking_to_dict(booking), status=201)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def my_bookings(request):
-    """List bookings for the current user (student sees theirs; teacher sees theirs)"""
-    user = request.user
-    if is_teacher(user) or is_admin(user):
-        qs = LessonBooking.objects.filter(teacher=user).order_by('-created_at')
-    else:
-        qs = LessonBooking.objects.filter(student=user).order_by('-created_at')
-    return Response([booking_to_dict(b) for b in qs])
+def slots(request):
+    """Open booking slots for a subject across all teachers.
 
-@api_view(['POST'])
+    ``subject`` (id) is required; ``from`` / ``to`` are dates (default: the
+    next 7 days), ``duration`` is the minimum slot length in hours (default 1,
+    at most ``MAX_SLOT_HOURS``) and ``teacher`` optionally narrows the search
+    to one teacher.
+    """
+    params = request.query_params
+    try:
+        subject_id = int(params['subject'])
+        hours = float(params.get('duration', 1))
+        teacher_id = int(params['teacher']) if params.get('teacher') else None
+    except (KeyError, ValueError):
+        return Response({"error": "subject (id) is required; duration and teacher must be numbers"}, status=400)
+    if not 0 < hours <= MAX_SLOT_HOURS:  # also false for nan and inf
+        return Response({"error": f"duration must be more than 0 and at most {MAX_SLOT_HOURS} hours"}, status=400)
+    duration = timedelta(hours=hours)
+
+    today = timezone.localdate()
+    try:
+        date_from = parse_date(params['from']) if params.get('from') else today
+        date_to = parse_date(params['to']) if params.get('to') else date_from + timedelta(days=7)
+    except ValueError:
+        date_from = date_to = None
+    if date_from is None or date_to is None or date_to < date_from:
+        return Response({"error": "from/to must be dates (YYYY-MM-DD) with from <= to"}, status=400)
+    if (date_to - date_from).days > MAX_SLOT_RANGE_DAYS:
+        return Response({"error": f"Search at most {MAX_SLOT_RANGE_DAYS} days at a time"}, status=400)
+
+    found = open_slots(subject_id, date_from, date_to, min_length=duration,
+                       not_before=ceil_to(timezone.now() + MIN_NOTICE, SLOT_STEP), teacher_id=teacher_id)
+    return Response([{
+        "availability_id": a.id,
+        "teacher_id": a.teacher_id,
+        "teacher": a.teacher.username,
+        "start": start,
+        "end": end,
+    } for start, end, a in found])
+
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def approve_booking(request, booking_id: int):
-    """Teacher (owner) or admin can approve a pending booking"""
-    user = request.user
+def day_slots(request):
+    """Free fixed-length slots for a subject on one day, from the materialized table.
+
+    ``subject`` (id) and ``date`` (YYYY-MM-DD) are required; ``teacher``
+    optionally narrows to one teacher. Slots inside the booking notice period
+    are left out. One indexed query; see bookings/slots.py.
+    """
+    params = request.query_params
     try:
-        booking = LessonBooking.objects.get(id=booking_id)
-    except LessonBooking.DoesNotExist:
-        return Response({"error": "Booking not found"}, status=404)
+        subject_id = int(params['subject'])
+        day = parse_date(params['date'])
+        teacher_id = int(params['teacher']) if params.get('teacher') else None
+    except (KeyError, ValueError, TypeError):
+        day = None
+    if day is None:
+        return Response({"error": "subject (id) and date (YYYY-MM-DD) are required; teacher must be a number"},
+                        status=400)
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    start = max(start, timezone.now() + MIN_NOTICE)
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return Response([{
+        "availability_id": s.availability_id,
+        "teacher_id": s.teacher_id,
+        "teacher": s.teacher.username,
+        "start": s.start_datetime,
+        "end": s.end_datetime,
+    } for s in free_slots(subject_id, start, end, teacher_id)])
 
-    if not (is_admin(user) or (is_teacher(user) and booking.teacher_id == user.id)):
-        return Response({"error": "Not allowed"}, status=403)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@conditional_on_versions(user_and_catalog_versions)
+def my_bookings(request):
+    """List bookings for the current user (student sees theirs; teacher sees theirs).
 
-    if booking.status != 'pending':
-        return Response({"error": "Only pending bookings can be approved"}, status=400)
+    Newest first, cursor-paginated on (created_at, id). Optional filters:
+    ``status``, ``from`` / ``to`` (on the lesson start), ``page_size``, ``cursor``.
+    """
+    user = request.user
+    params = request.query_params
+    try:
+        qs, page_size = my_bookings_query(user, params, is_teacher(user) or is_admin(user))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    try:
+        items, next_cursor = keyset_page(qs, 'created_at', params.get('cursor'), page_size)
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({
+        "results": [booking_to_dict(b) for b in items],
+        "next_cursor": next_cursor,
+    })
 
-    booking.status = 'approved'
-    booking.save()
+def _single_status_change(request, booking_id, new_status, verb):
+    user = request.user
+    if not (is_admin(user) or is_teacher(user)):
+        return Response({"error": "Not allowed"}, status=403)
+    outcome = set_pending_status(user, [booking_id], new_status)[booking_id]
+    if outcome == 'not_found':
+        return Response({"error": "Booking not found"}, status=404)
+    if outcome == 'forbidden':
+        return Response({"error": "Not allowed"}, status=403)
+    if outcome == 'not_pending':
+        return Response({"error": f"Only pending bookings can be {verb}"}, status=400)
+    booking = LessonBooking.objects.select_related('student', 'teacher', 'subject').get(id=booking_id)
     return Response(booking_to_dict(booking))
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def approve_booking(request, booking_id: int):
+    """Teacher (owner) or admin can approve a pending booking"""
+    return _single_status_change(request, booking_id, 'approved', 'approved')
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def reject_booking(request, booking_id: int):
     """Teacher (owner) or admin can reject a pending booking"""
-    user = request.user
-    try:
-        booking = LessonBooking.objects.get(id=booking_id)
-    except LessonBooking.DoesNotExist:
-        return Response({"error": "Booking not found"}, status=404)
+    return _single_status_change(request, booking_id, 'rejected', 'rejected')
 
-    if not (is_admin(user) or (is_teacher(user) and booking.teacher_id == user.id)):
-        return Response({"error": "Not allowed"}, status=403)
-
-    if booking.status != 'pending':
-        return Response({"error": "Only pending bookings can be rejected"}, status=400)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_status(request):
+    """Approve or reject many pending bookings at once.
 
-    booking.status = 'rejected'
-    booking.save()
-    return Response(booking_to_dict(booking))
+    Body: ``{"ids": [...], "status": "approved" | "rejected"}``. Returns the
+    outcome per id: updated, not_found, forbidden or not_pending.
+    """
+    user = request.user
+    if not (is_admin(user) or is_teacher(user)):
+        return Response({"error": "Not allowed"}, status=403)
+    new_status = request.data.get('status')
+    if new_status not in ('approved', 'rejected'):
+        return Response({"error": "status must be 'approved' or 'rejected'"}, status=400)
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return Response({"error": "ids must be a non-empty list"}, status=400)
+    if len(ids) > MAX_BULK_IDS:
+        return Response({"error": f"At most {MAX_BULK_IDS} ids per request"}, status=400)
+    try:
+        outcomes = set_pending_status(user, ids, new_status)
+    except (TypeError, ValueError):
+        return Response({"error": "ids must be integers"}, status=400)
+    return Response({
+        "updated": sum(1 for o in outcomes.values() if o == 'updated'),
+        "results": [{"id": pk, "result": outcome} for pk, outcome in sorted(outcomes.items())],
+    })
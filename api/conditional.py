@@ -0,0 +1,146 @@
+# api/conditional.py
+import hashlib
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from core import versions
+
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def etag_matches(request, etag):
+    """True if ``If-None-Match`` names ``etag`` (weak comparison, as RFC 9110 asks for GET)."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    tags = parse_etags(header)
+    if tags == ['*']:
+        return True
+    strip = lambda t: t[2:] if t.startswith('W/') else t  # noqa: E731
+    return strip(etag) in {strip(t) for t in tags}
+
+
+def not_modified(etag, cache_control='no-cache', last_modified=None):
+    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _hash_etag(*parts):
+    return '"%s"' % hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
+
+
+def _payload_etag(response):
+    if hasattr(response, 'data'):
+        return _hash_etag(json.dumps(response.data, sort_keys=True, default=str))
+    return '"%s"' % hashlib.sha256(response.content).hexdigest()[:32]
+
+
+def _versioned(request, tokens):
+    """``(etag, last_modified, fresh)`` for the given version tokens.
+
+    HTTP dates have one-second resolution, so ``Last-Modified`` is the second
+    after the newest version, and only once that second has passed (else
+    None): any later write is then stamped at or after it. ``If-Modified-Since``
+    counts as fresh only when strictly after the newest version, so a write in
+    the same second as the client's copy is never answered with 304.
+    """
+    etag = _hash_etag(*tokens, request.get_full_path())
+    newest = max(versions.version_time(t) for t in tokens).timestamp()
+    last_modified = int(newest) + 1
+    if last_modified > time.time():
+        last_modified = None
+    if 'If-None-Match' in request.headers:
+        fresh = etag_matches(request, etag)
+    else:
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        fresh = since is not None and since > newest
+    return etag, last_modified, fresh
+
+
+def _finish(response, etag, last_modified=None):
+    response['ETag'] = etag
+    response['Cache-Control'] = PRIVATE_CACHE_CONTROL
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Cookie', 'Authorization'))
+    return response
+
+
+def conditional_on_versions(keys_for):
+    """Conditional GET for per-user views, driven by ``core.versions``.
+
+    ``keys_for(request)`` returns the version keys the response depends on.
+    The ETag covers those versions and the full path (so filters and cursors
+    get their own tags), and ``Last-Modified`` follows the newest version's
+    issue time (see ``_versioned``). A matching ``If-None-Match`` (or, without one, ``If-Modified-Since``)
+    is answered with 304 after a single cache read, before the view runs.
+
+    Without a shared cache (``VERSIONED_CACHE_ENABLED`` off) versions can't be
+    trusted across workers, so the view runs and the ETag is a hash of its
+    data: that saves the transfer, not the queries.
+
+    Works on DRF function views (apply below ``@api_view``/``@permission_classes``)
+    and on plain async views. Non-GET requests and error responses pass
+    straight through.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                if not versions.enabled():
+                    response = await view(request, *args, **kwargs)
+                    return _from_payload(request, response, HttpResponseNotModified)
+                tokens = await versions.acurrent_versions(keys_for(request))
+                etag, last_modified, fresh = _versioned(request, tokens)
+                if fresh:
+                    return _finish(HttpResponseNotModified(), etag, last_modified)
+                response = await view(request, *args, **kwargs)
+                return _finish(response, etag, last_modified) if response.status_code == 200 else response
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            if not versions.enabled():
+                response = view(request, *args, **kwargs)
+                return _from_payload(request, response, lambda: Response(status=status.HTTP_304_NOT_MODIFIED))
+            tokens, _ = versions.current_versions(keys_for(request))
+            etag, last_modified, fresh = _versioned(request, tokens)
+            if fresh:
+                return _finish(not_modified(etag, PRIVATE_CACHE_CONTROL), etag, last_modified)
+            response = view(request, *args, **kwargs)
+            return _finish(response, etag, last_modified) if response.status_code == 200 else response
+        return wrapped
+    return decorator
+
+
+def _from_payload(request, response, make_304):
+    if response.status_code != 200:
+        return response
+    etag = _payload_etag(response)
+    if etag_matches(request, etag):
+        response = make_304()
+    return _finish(response, etag)
+
+
+def user_version(request):
+    return [versions.user_key(request.user.pk)]
+
+
+def user_and_catalog_versions(request):
+    return [versions.user_key(request.user.pk), versions.version_key(versions.CATALOG)]
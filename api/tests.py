@@ -1,3 +1,367 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from bookings.models import LessonBooking
+from core.testing import Budget, QueryBudgetTestCase, url_names
+from homework.uploads import get_backend, start_upload
+from subjects.catalog import clear_local
+from subjects.models import Subject, TeacherSubject, UserSubject
+
+from . import urls
+from .authentication import issue_tokens
+
+
+class SubjectCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bio = Subject.objects.create(code="BIO", name="Biology")
+        Subject.objects.create(code="ART", name="Art")
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.client.force_login(User.objects.create_user("student"))
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("api_subjects")).status_code, 403)
+
+    def test_lists_subjects_with_strong_etag(self):
+        response = self.client.get(reverse("api_subjects"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["code"] for s in response.json()], ["ART", "BIO"])
+        self.assertRegex(response["ETag"], r'^"[0-9a-f]+"$')
+
+    def test_if_none_match_is_answered_without_catalog_queries(self):
+        etag = self.client.get(reverse("api_subjects"))["ETag"]
+        for enabled in (False, True):
+            with self.subTest(shared_cache=enabled), override_settings(VERSIONED_CACHE_ENABLED=enabled):
+                self.client.get(reverse("api_subjects"))
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse("api_subjects"), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response["ETag"], etag)
+                self.assertFalse([q for q in ctx.captured_queries if "subjects_subject" in q["sql"]])
+
+    def test_subject_changes_invalidate(self):
+        etag = self.client.get(reverse("api_subjects"))["ETag"]
+        self.bio.name = "Biology (GCSE)"
+        self.bio.save()
+        response = self.client.get(reverse("api_subjects"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Biology (GCSE)", [s["name"] for s in response.json()])
+
+        Subject.objects.filter(code="ART").delete()
+        self.assertEqual(len(self.client.get(reverse("api_subjects")).json()), 1)
+
+
+@override_settings(VERSIONED_CACHE_ENABLED=True)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        cls.student = User.objects.create_user("student", password="x")
+        cls.student.groups.add(Group.objects.get_or_create(name="student")[0])
+        cls.subject = Subject.objects.create(code="PHY", name="Physics")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=cls.subject)
+        UserSubject.objects.create(user=cls.student, subject=cls.subject)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        # force_authenticate skips the session lookup, so only the view's own queries count
+        self.api.force_authenticate(self.student)
+
+    def book(self):
+        start = timezone.now() + timedelta(days=3)
+        return LessonBooking.objects.create(student=self.student, teacher=self.teacher, subject=self.subject,
+                                            start_datetime=start, end_datetime=start + timedelta(hours=1))
+
+    def test_unchanged_polls_are_304_without_queries(self):
+        self.book()
+        for name in ("api_me", "api_my_subjects", "api_my_bookings"):
+            with self.subTest(name):
+                first = self.api.get(reverse(name))
+                self.assertEqual(first.status_code, 200)
+                with self.assertNumQueries(0):
+                    again = self.api.get(reverse(name), HTTP_IF_NONE_MATCH=first["ETag"])
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again["ETag"], first["ETag"])
+
+    def test_if_modified_since(self):
+        url = reverse("api_my_bookings")
+        with mock.patch("core.versions.time.time_ns", return_value=time.time_ns() - 2 * 10 ** 9):
+            self.book()
+            self.api.get(url)
+        first = self.api.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.book()
+        self.assertEqual(self.api.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 200)
+
+    def test_write_in_the_same_second_is_not_a_304(self):
+        url = reverse("api_my_bookings")
+        since = http_date(time.time())
+        self.api.get(url)
+        self.book()
+        response = self.api.get(url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 1)
+
+    def test_writes_change_the_etag(self):
+        url = reverse("api_my_bookings")
+        etag = self.api.get(url)["ETag"]
+        booking = self.book()
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["id"], booking.id)
+
+        etag = response["ETag"]
+        self.api.force_authenticate(self.teacher)
+        self.api.post(reverse("api_approve_booking", args=[booking.id]))
+        self.api.force_authenticate(self.student)
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["status"], "approved")
+
+    def test_etag_depends_on_query_and_user(self):
+        url = reverse("api_my_bookings")
+        etag = self.api.get(url)["ETag"]
+        self.assertEqual(self.api.get(url + "?status=approved", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.api.force_authenticate(self.teacher)
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_subject_selection_changes_my_subjects(self):
+        url = reverse("api_my_subjects")
+        etag = self.api.get(url)["ETag"]
+        self.api.post(url, {"subject_ids": []}, format="json")
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+    @override_settings(VERSIONED_CACHE_ENABLED=False)
+    def test_without_shared_cache_etag_comes_from_the_payload(self):
+        url = reverse("api_me")
+        etag = self.api.get(url)["ETag"]
+        response = self.api.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.student.username = "renamed"
+        self.student.save()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AsyncApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        cls.student = User.objects.create_user("student", password="x")
+        cls.student.groups.add(Group.objects.get_or_create(name="student")[0])
+        cls.subject = Subject.objects.create(code="PHY", name="Physics")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=cls.subject)
+        UserSubject.objects.create(user=cls.student, subject=cls.subject)
+        start = timezone.now() + timedelta(days=3)
+        cls.booking = LessonBooking.objects.create(student=cls.student, teacher=cls.teacher, subject=cls.subject,
+                                                   start_datetime=start, end_datetime=start + timedelta(hours=1))
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_read_endpoints_match_sync_versions(self):
+        await self.async_client.aforce_login(self.student)
+        await sync_to_async(self.client.force_login)(self.student)
+        for name in ("me", "my_subjects", "my_bookings"):
+            with self.subTest(name):
+                sync = (await sync_to_async(self.client.get)(reverse(f"api_{name}"))).json()
+                response = await self.async_client.get(reverse(f"api_async_{name}"))
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                if name == "my_bookings":
+                    # DRF keeps microseconds, DjangoJSONEncoder rounds to milliseconds
+                    strip = lambda rows: [{k: v for k, v in r.items() if k not in ("start", "end", "created_at")}
+                                          for r in rows]  # noqa: E731
+                    sync, data = strip(sync["results"]), strip(data["results"])
+                self.assertEqual(data, sync)
+
+    async def test_anonymous_requests_are_rejected(self):
+        for name in ("api_async_my_bookings", "api_async_subjects"):
+            with self.subTest(name):
+                response = await self.async_client.get(reverse(name))
+                self.assertEqual(response.status_code, 403)
+
+    async def test_teacher_approves_through_async_endpoint(self):
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.post(reverse("api_async_approve_booking", args=[self.booking.id]))
+        self.assertEqual(response.status_code, 403)
+
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.post(reverse("api_async_approve_booking", args=[self.booking.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "approved")
+        response = await self.async_client.post(reverse("api_async_bulk_booking_status"),
+                                                {"ids": [self.booking.id], "status": "rejected"},
+                                                content_type="application/json")
+        self.assertEqual(response.json()["results"], [{"id": self.booking.id, "result": "not_pending"}])
+
+
+class SignedTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="teacher-pw")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        cls.student = User.objects.create_user("student", password="student-pw")
+        cls.student.groups.add(Group.objects.get_or_create(name="student")[0])
+        cls.subject = Subject.objects.create(code="CHEM", name="Chemistry")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=cls.subject)
+        start = timezone.now() + timedelta(days=2)
+        cls.booking = LessonBooking.objects.create(student=cls.student, teacher=cls.teacher, subject=cls.subject,
+                                                   start_datetime=start, end_datetime=start + timedelta(hours=1))
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def tokens(self, username, password):
+        response = self.api.post(reverse("api_token"), {"username": username, "password": password}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def bearer(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client
+
+    def test_access_token_authenticates_without_a_query(self):
+        client = self.bearer(self.tokens("student", "student-pw")["access"])
+        with self.assertNumQueries(0):
+            response = client.get(reverse("api_me"))
+        self.assertEqual(response.json(), {"id": self.student.id, "username": "student"})
+        with self.assertNumQueries(1):  # the bookings page itself
+            response = client.get(reverse("api_my_bookings"))
+        self.assertEqual([b["id"] for b in response.json()["results"]], [self.booking.id])
+
+    def test_role_claims_authorise_teacher_actions(self):
+        student = self.bearer(self.tokens("student", "student-pw")["access"])
+        self.assertEqual(student.post(reverse("api_approve_booking", args=[self.booking.id])).status_code, 403)
+        teacher = self.bearer(self.tokens("teacher", "teacher-pw")["access"])
+        response = teacher.post(reverse("api_approve_booking", args=[self.booking.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "approved")
+
+    def test_bad_credentials_and_tokens_are_rejected(self):
+        response = self.api.post(reverse("api_token"), {"username": "student", "password": "nope"}, format="json")
+        self.assertEqual(response.status_code, 401)
+        tokens = self.tokens("student", "student-pw")
+        for access in (tokens["access"][:-2] + "xx", tokens["refresh"], "garbage"):
+            self.assertEqual(self.bearer(access).get(reverse("api_me")).status_code, 403)
+        with override_settings(API_ACCESS_TOKEN_SECONDS=-1):
+            response = self.bearer(tokens["access"]).get(reverse("api_me"))
+        self.assertEqual(response.json()["detail"], "Token has expired.")
+
+    def test_refresh_issues_a_new_pair_until_the_password_changes(self):
+        refresh = self.tokens("student", "student-pw")["refresh"]
+        response = self.api.post(reverse("api_token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.bearer(response.json()["access"]).get(reverse("api_me")).status_code, 200)
+
+        self.student.set_password("changed-pw")
+        self.student.save()
+        response = self.api.post(reverse("api_token_refresh"), {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+    def test_key_rotation(self):
+        with override_settings(API_TOKEN_KEYS=["old-key"]):
+            old = self.tokens("student", "student-pw")["access"]
+        with override_settings(API_TOKEN_KEYS=["new-key", "old-key"]):
+            self.assertEqual(self.bearer(old).get(reverse("api_me")).status_code, 200)
+            new = self.tokens("student", "student-pw")["access"]
+        with override_settings(API_TOKEN_KEYS=["new-key"]):
+            self.assertEqual(self.bearer(old).get(reverse("api_me")).status_code, 403)
+            self.assertEqual(self.bearer(new).get(reverse("api_me")).status_code, 200)
+
+
+def upload_fields(pair, task):
+    target = start_upload(task, pair.student, "essay.pdf", "application/pdf")
+    return dict(target["fields"], file=SimpleUploadedFile("essay.pdf", b"%PDF-1.4")), target["ticket"]
+
+
+def uploaded_ticket(pair, task):
+    fields, ticket = upload_fields(pair, task)
+    get_backend().accept(fields["token"], fields["key"], fields["Content-Type"], fields["file"])
+    return {"ticket": ticket}
+
+
+def refresh_token(user):
+    return issue_tokens(user)["refresh"]
+
+
+def booking_budgets(prefix, offset, queries):
+    """Budgets for the booking endpoints under ``prefix`` (sync or async), using their own pending rows."""
+    # without row locks (SQLite) a status change takes the write lock with one no-op UPDATE first
+    lock = 0 if connection.features.has_select_for_update else 1
+    return [
+        Budget(f"{prefix}my_bookings", "student", queries["my_bookings"]),
+        Budget(f"{prefix}my_bookings", "teacher", queries["my_bookings"]),
+        Budget(f"{prefix}request_booking", "student", queries["request_booking"], method="post", status=201,
+               data=lambda p: {"availability_id": p.availability.id, "start": p.free_starts[offset]}),
+        Budget(f"{prefix}approve_booking", "teacher", queries["approve"] + lock, method="post",
+               kwargs=lambda p: {"booking_id": p.pending[offset * 10]}),
+        # rejecting also frees the teacher's materialized slots, under the teacher lock
+        Budget(f"{prefix}reject_booking", "teacher", queries["reject"] + lock, method="post",
+               kwargs=lambda p: {"booking_id": p.pending[offset * 10 + 1]}),
+        Budget(f"{prefix}bulk_booking_status", "teacher", queries["bulk_status"] + lock, method="post",
+               data=lambda p: {"ids": p.pending[offset * 10 + 2:offset * 10 + 7], "status": "approved"}),
+    ]
+
+
+class ApiQueryBudgetTests(QueryBudgetTestCase):
+    budgets = [
+        Budget("api_me", "student", 3),
+        Budget("api_subjects", "student", 4),
+        Budget("api_my_subjects", "student", 4),
+        Budget("api_my_subjects", "student", 10, method="post",
+               data=lambda p: {"subject_ids": [s.id for s in p.subjects[:1]]}),
+        Budget("api_token", None, 1, method="post", status=401,
+               data=lambda p: {"username": p.student.username, "password": "wrong"}),
+        # the user row and its roles, for the new access token
+        Budget("api_token_refresh", None, 2, method="post", data=lambda p: {"refresh": refresh_token(p.student)}),
+        Budget("api_slots", "student", 5, data=lambda p: {"subject": p.subjects[0].id}),
+        Budget("api_day_slots", "student", 4, data=lambda p: {"subject": p.subjects[0].id,
+                                                              "date": p.free_starts[0][:10]}),
+        *booking_budgets("api_", 0, {"my_bookings": 4, "request_booking": 17, "approve": 9, "reject": 13,
+                                     "bulk_status": 8}),
+        Budget("api_submission_upload_target", "student", 6, method="post",
+               kwargs=lambda p: {"task_id": p.tasks[2].id},
+               data=lambda p: {"filename": "essay.pdf", "content_type": "application/pdf"}),
+        Budget("api_local_upload", None, 0, method="post", status=204, multipart=True,
+               data=lambda p: upload_fields(p, p.tasks[2])[0]),
+        Budget("api_confirm_submission", "student", 11, method="post", status=201,
+               kwargs=lambda p: {"task_id": p.tasks[2].id}, data=lambda p: uploaded_ticket(p, p.tasks[2])),
+
+        Budget("api_async_me", "student", 3),
+        Budget("api_async_subjects", "student", 4),
+        Budget("api_async_my_subjects", "student", 4),
+        Budget("api_async_my_subjects", "student", 9, method="post",
+               data=lambda p: {"subject_ids": [s.id for s in p.subjects]}),
+        *booking_budgets("api_async_", 1, {"my_bookings": 4, "request_booking": 18, "approve": 9, "reject": 13,
+                                           "bulk_status": 8}),
+    ]
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(set(url_names(urls.urlpatterns)) - {b.name for b in self.budgets}, set())
@@ -0,0 +1,66 @@
+# api/uploads.py
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
+from homework.models import Task
+from homework.services import SubmissionError, check_can_submit, submit_upload
+from homework.uploads import LocalPresignedUploads, UploadError, get_backend, start_upload, verify_upload
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def upload_target(request, task_id):
+    """Step 1: a presigned POST target under submissions/<task>/<student>/.
+
+    Body: ``filename``, ``content_type`` and optionally ``size`` (bytes).
+    """
+    task = get_object_or_404(Task, id=task_id)
+    try:
+        check_can_submit(request.user, task)
+        size = request.data.get('size')
+        target = start_upload(task, request.user, request.data.get('filename', ''),
+                              request.data.get('content_type', ''), int(size) if size not in (None, '') else None)
+    except (SubmissionError, UploadError) as e:
+        return Response({"error": str(e)}, status=e.status_code)
+    except (TypeError, ValueError):
+        return Response({"error": "size must be an integer"}, status=400)
+    return Response(target)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def confirm_upload(request, task_id):
+    """Step 2: check the stored object, then create the Submission. Body: ``ticket``.
+
+    Idempotent: confirming the same ticket again returns the same submission (200).
+    """
+    task = get_object_or_404(Task, id=task_id)
+    try:
+        check_can_submit(request.user, task)
+        name = verify_upload(task, request.user, request.data.get('ticket'))
+        sub, created = submit_upload(task, request.user, name)
+    except (SubmissionError, UploadError) as e:
+        return Response({"error": str(e)}, status=e.status_code)
+    except ValidationError as e:
+        return Response({"error": e.messages[0]}, status=400)
+    return Response({"id": sub.id, "submitted_at": sub.submitted_at},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def local_upload(request):
+    """Upload target for ``LocalPresignedUploads``; the signed token is the only credential."""
+    backend = get_backend()
+    if not isinstance(backend, LocalPresignedUploads):
+        return Response({"error": "Not found"}, status=404)
+    try:
+        backend.accept(request.data.get('token'), request.data.get('key'),
+                       request.data.get('Content-Type'), request.FILES.get('file'))
+    except UploadError as e:
+        return Response({"error": str(e)}, status=e.status_code)
+    return Response(status=status.HTTP_204_NO_CONTENT)
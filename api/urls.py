@@ -1,14 +1,27 @@
-from django.urls import path
+from django.urls import include, path
 from . import views
 from . import bookings as booking_views
+from . import uploads as upload_views
 
 urlpatterns = [
     path('me/', views.me, name='api_me'),
     path('subjects/', views.subjects, name='api_subjects'),
     path('my-subjects/', views.my_subjects, name='api_my_subjects'),
+    path('token/', views.token, name='api_token'),
+    path('token/refresh/', views.token_refresh, name='api_token_refresh'),
 
+    path('slots/', booking_views.slots, name='api_slots'),
+    path('slots/day/', booking_views.day_slots, name='api_day_slots'),
     path('bookings/request/', booking_views.request_booking, name='api_request_booking'),
     path('bookings/mine/', booking_views.my_bookings, name='api_my_bookings'),
+    path('bookings/bulk-status/', booking_views.bulk_status, name='api_bulk_booking_status'),
     path('bookings/<int:booking_id>/approve/', booking_views.approve_booking, name='api_approve_booking'),
     path('bookings/<int:booking_id>/reject/', booking_views.reject_booking, name='api_reject_booking'),
+
+    path('tasks/<int:task_id>/upload-target/', upload_views.upload_target, name='api_submission_upload_target'),
+    path('tasks/<int:task_id>/submissions/', upload_views.confirm_upload, name='api_confirm_submission'),
+    path('uploads/local/', upload_views.local_upload, name='api_local_upload'),
+
+    # async (ASGI) versions of the read endpoints and booking actions
+    path('async/', include('api.async_urls')),
 ]
@@ -1,27 +1,64 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from django.contrib.auth import authenticate
+from django.core.exceptions import ValidationError
 from subjects.models import Subject, UserSubject
+from subjects.catalog import get_catalog
+from subjects.services import set_student_subjects
+from .authentication import TokenError, issue_tokens, refresh_user
+from .conditional import (conditional_on_versions, etag_matches, not_modified, user_and_catalog_versions,
+                          user_version)
+
+CATALOG_CACHE_CONTROL = 'private, no-cache'
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_on_versions(user_version)
 def me(request):
     return Response({"id": request.user.id, "username": request.user.username})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def subjects(request):
-    data = [{"id": s.id, "code": s.code, "name": s.name} for s in Subject.objects.all().order_by('name')]
-    return Response(data)
+    # the same for every user: a 304 costs the session lookup and no catalog query
+    catalog = get_catalog()
+    if etag_matches(request, catalog.etag):
+        return not_modified(catalog.etag, CATALOG_CACHE_CONTROL)
+    response = Response(catalog.as_list())
+    response['ETag'] = catalog.etag
+    response['Cache-Control'] = CATALOG_CACHE_CONTROL
+    return response
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@conditional_on_versions(user_and_catalog_versions)
 def my_subjects(request):
     if request.method == 'POST':
-        ids = request.data.get('subject_ids', [])
-        UserSubject.objects.filter(user=request.user).delete()
-        for sid in ids:
-            UserSubject.objects.create(user=request.user, subject_id=sid)
+        try:
+            set_student_subjects(request.user, request.data.get('subject_ids', []))
+        except ValidationError as e:
+            return Response({"error": e.messages[0]}, status=400)
     mine = [{"id": us.subject.id, "code": us.subject.code, "name": us.subject.name}
             for us in UserSubject.objects.filter(user=request.user).select_related('subject')]
     return Response(mine)
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token(request):
+    user = authenticate(request._request, username=request.data.get('username'),
+                        password=request.data.get('password'))
+    if user is None:
+        return Response({"error": "Invalid username or password."}, status=401)
+    return Response(issue_tokens(user))
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    try:
+        user = refresh_user(request.data.get('refresh'))
+    except TokenError as e:
+        return Response({"error": str(e)}, status=401)
+    return Response(issue_tokens(user))
@@ -0,0 +1,58 @@
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+# statuses that hold a teacher's time; rejected/cancelled/completed free it
+ACTIVE_STATUSES = ('pending', 'approved')
+
+
+class TeacherIntervalIndex:
+    """Busy intervals per teacher, sorted by start, for in-memory overlap checks.
+
+    Intervals are half-open ``[start, end)``, matching the database constraint,
+    so back-to-back lessons do not conflict. Lookups are a bisect plus a
+    prefix-max of end times, so legacy rows that overlap each other are still
+    handled correctly.
+    """
+
+    def __init__(self):
+        self._intervals = defaultdict(list)
+        self._max_ends = {}
+
+    @classmethod
+    def load(cls, teacher_ids, start, end):
+        """Index the active bookings of ``teacher_ids`` that touch ``[start, end)`` (one query)."""
+        from .models import LessonBooking
+
+        index = cls()
+        rows = (LessonBooking.objects
+                .filter(teacher_id__in=teacher_ids, status__in=ACTIVE_STATUSES,
+                        start_datetime__lt=end, end_datetime__gt=start)
+                .values_list('teacher_id', 'start_datetime', 'end_datetime'))
+        for teacher_id, b_start, b_end in rows:
+            index.add(teacher_id, b_start, b_end)
+        return index
+
+    def add(self, teacher_id, start, end):
+        insort(self._intervals[teacher_id], (start, end))
+        self._max_ends.pop(teacher_id, None)
+
+    def busy(self, teacher_id):
+        return self._intervals.get(teacher_id, [])
+
+    def _prefix_max_ends(self, teacher_id):
+        max_ends = self._max_ends.get(teacher_id)
+        if max_ends is None:
+            max_ends, current = [], None
+            for _, end in self._intervals[teacher_id]:
+                current = end if current is None or end > current else current
+                max_ends.append(current)
+            self._max_ends[teacher_id] = max_ends
+        return max_ends
+
+    def overlaps(self, teacher_id, start, end):
+        intervals = self._intervals.get(teacher_id)
+        if not intervals:
+            return False
+        # intervals starting before `end` are candidates; any of them ending after `start` overlaps
+        i = bisect_left(intervals, (end,))
+        return i > 0 and self._prefix_max_ends(teacher_id)[i - 1] > start
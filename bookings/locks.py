@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import F
+
+User = get_user_model()
+
+
+def lock_teacher(teacher_id):
+    """Serialise booking writes for one teacher until the transaction ends."""
+    if connection.features.has_select_for_update:
+        list(User.objects.select_for_update().filter(pk=teacher_id).values_list('pk', flat=True))
+    else:
+        # SQLite has no row locks: a no-op write takes the database write lock
+        # now, so a concurrent booking waits here instead of racing the check.
+        User.objects.filter(pk=teacher_id).update(is_active=F('is_active'))
+
+
+def lock_teachers(teacher_ids):
+    """``lock_teacher`` for each id, in id order so concurrent callers can't deadlock."""
+    for teacher_id in sorted(set(teacher_ids)):
+        lock_teacher(teacher_id)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.models import TeacherAvailability
+from bookings.slots import horizon, materialize, prune
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the AvailabilitySlot table from TeacherAvailability for the next --weeks weeks, "
+            "marking booked slots. Run daily to roll the horizon forward; edits in between are applied "
+            "as they happen.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, help="horizon (default: settings.AVAILABILITY_SLOT_WEEKS)")
+        parser.add_argument("--teacher", type=int, action="append", help="only this teacher id (repeatable)")
+        parser.add_argument("--teachers-per-batch", type=int, default=500,
+                            help="teachers rebuilt per transaction")
+
+    def handle(self, *args, **opts):
+        began = time.monotonic()
+        start, end = horizon(opts["weeks"])
+        pruned = prune()
+        if opts["teacher"]:
+            teacher_ids = opts["teacher"]
+        else:
+            teacher_ids = sorted(set(TeacherAvailability.objects.values_list("teacher_id", flat=True)))
+        # one transaction per batch, so a big rebuild doesn't hold every teacher's rows at once
+        total = 0
+        step = opts["teachers_per_batch"]
+        for i in range(0, len(teacher_ids), step):
+            total += materialize(teacher_ids[i:i + step], opts["weeks"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Materialized {total} slots for {len(teacher_ids)} teachers from {start:%Y-%m-%d} to "
+            f"{end:%Y-%m-%d} ({pruned} past slots pruned) in {time.monotonic() - began:.1f}s"))
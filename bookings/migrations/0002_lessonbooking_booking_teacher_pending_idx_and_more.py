@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+        ('subjects', '0002_teachersubject'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['teacher', 'start_datetime'], name='booking_teacher_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['teacher', 'status', 'start_datetime'], name='booking_teacher_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['teacher', '-created_at', '-id'], name='booking_teacher_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonbooking',
+            index=models.Index(fields=['student', '-created_at', '-id'], name='booking_student_created_idx'),
+        ),
+    ]
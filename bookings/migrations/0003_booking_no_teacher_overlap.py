@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# A teacher can't hold two active (pending/approved) bookings whose
+# [start, end) ranges overlap. Exclusion constraints are Postgres-only, so
+# other backends rely on the locking in bookings.services.book_lesson.
+CONSTRAINT_SQL = """
+ALTER TABLE bookings_lessonbooking
+ADD CONSTRAINT booking_no_teacher_overlap
+EXCLUDE USING gist (
+    teacher_id WITH =,
+    tstzrange(start_datetime, end_datetime, '[)') WITH &&
+) WHERE (status IN ('pending', 'approved'))
+"""
+
+
+def add_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(CONSTRAINT_SQL)
+
+
+def drop_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE bookings_lessonbooking DROP CONSTRAINT IF EXISTS booking_no_teacher_overlap"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_lessonbooking_booking_teacher_pending_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_constraint, drop_constraint),
+    ]
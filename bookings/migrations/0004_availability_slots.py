@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_booking_no_teacher_overlap'),
+        ('subjects', '0002_teachersubject'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilitySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('booked', models.BooleanField(default=False)),
+                ('availability', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='bookings.teacheravailability')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='subjects.subject')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('booked', False)), fields=['subject', 'start_datetime'], name='slot_subject_free_idx'), models.Index(fields=['teacher', 'start_datetime'], name='slot_teacher_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('availability', 'start_datetime'), name='slot_availability_start_uniq')],
+            },
+        ),
+    ]
@@ -1,11 +1,12 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from subjects.models import Subject, TeacherSubject
+from subjects.models import Subject
 from django.core.exceptions import ValidationError
+from core.validation import BatchValidatedModel
 
 User = get_user_model()
 
-class TeacherAvailability(models.Model):
+class TeacherAvailability(BatchValidatedModel, models.Model):
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='availabilities')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     weekday = models.IntegerField(choices=[(i, day) for i, day in enumerate(
@@ -17,20 +18,17 @@ class TeacherAvailability(models.Model):
     def __str__(self):
         return f"{self.teacher.username} - {self.subject.name} on {self.get_weekday_display()} {self.start_time}-{self.end_time}"
     def clean(self):
+        ctx = self.validation_context()
         # Only allow users in the "teacher" group
-        if self.teacher and not self.teacher.groups.filter(name="teacher").exists():
+        if self.teacher_id and not ctx.is_teacher(self.teacher_id):
             raise ValidationError({"teacher": "Selected user is not in the 'teacher' group."})
         if self.end_time and self.start_time and self.end_time <= self.start_time:
             raise ValidationError({"end_time": "End time must be after start time."})
         if self.teacher_id and self.subject_id:
-            if not TeacherSubject.objects.filter(teacher_id=self.teacher_id, subject_id=self.subject_id).exists():
+            if not ctx.teaches(self.teacher_id, self.subject_id):
                 raise ValidationError({"subject": "This teacher has not selected this subject."})
 
-    def save(self, *args, **kwargs):
-        self.full_clean()  # ensures clean() runs in admin/shell
-        return super().save(*args, **kwargs)
-
-class LessonBooking(models.Model):
+class LessonBooking(BatchValidatedModel, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('approved', 'Approved'),
@@ -47,12 +45,24 @@ class LessonBooking(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # teacher dashboard: pending requests in lesson order
+            models.Index(fields=['teacher', 'start_datetime'], condition=models.Q(status='pending'),
+                         name='booking_teacher_pending_idx'),
+            models.Index(fields=['teacher', 'status', 'start_datetime'], name='booking_teacher_status_idx'),
+            # dashboards + /api/bookings/mine/ (newest first, keyset on created_at, id)
+            models.Index(fields=['teacher', '-created_at', '-id'], name='booking_teacher_created_idx'),
+            models.Index(fields=['student', '-created_at', '-id'], name='booking_student_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.subject.name} with {self.teacher.username} ({self.status})"
     def clean(self):
+        ctx = self.validation_context()
         errors = {}
         # teacher must be in 'teacher' group
-        if self.teacher and not self.teacher.groups.filter(name="teacher").exists():
+        if self.teacher_id and not ctx.is_teacher(self.teacher_id):
             errors["teacher"] = "Selected user is not in the 'teacher' group."
         # basic datetime sanity
         if self.end_datetime and self.start_datetime and self.end_datetime <= self.start_datetime:
@@ -60,11 +70,36 @@ class LessonBooking(models.Model):
         if errors:
             raise ValidationError(errors)
         if self.teacher_id and self.subject_id:
-            if not TeacherSubject.objects.filter(teacher_id=self.teacher_id, subject_id=self.subject_id).exists():
+            if not ctx.teaches(self.teacher_id, self.subject_id):
                 errors["subject"] = "Teacher does not teach this subject."
         if errors:
             raise ValidationError(errors)
-    # ✅ and this:
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        return super().save(*args, **kwargs)
+
+class AvailabilitySlot(models.Model):
+    """One fixed-length piece of a weekly availability window on a real date.
+
+    Materialized ahead for a rolling horizon by ``bookings.slots.materialize``
+    and kept current by the signal receivers there. ``booked`` is true while
+    any active booking of the teacher (in any subject) overlaps the slot.
+    """
+    availability = models.ForeignKey(TeacherAvailability, on_delete=models.CASCADE, related_name='slots')
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+')
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    booked = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['availability', 'start_datetime'], name='slot_availability_start_uniq'),
+        ]
+        indexes = [
+            # "free <subject> slots on <day>": one range scan over free rows only
+            models.Index(fields=['subject', 'start_datetime'], condition=models.Q(booked=False),
+                         name='slot_subject_free_idx'),
+            # re-marking a teacher's slots when their bookings change
+            models.Index(fields=['teacher', 'start_datetime'], name='slot_teacher_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.teacher.username} - {self.subject.name} at {self.start_datetime:%Y-%m-%d %H:%M}"
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.outbox import enqueue_many
+from core.versions import bump_users
+
+from .intervals import ACTIVE_STATUSES, TeacherIntervalIndex
+from .locks import lock_teacher, lock_teachers
+from .models import LessonBooking
+from .slots import mark_booked
+
+MIN_NOTICE = timedelta(hours=24)
+# Postgres-only; see migrations/0003_booking_no_teacher_overlap.py
+OVERLAP_CONSTRAINT = 'booking_no_teacher_overlap'
+
+
+class BookingError(Exception):
+    status_code = 400
+
+
+class BookingConflict(BookingError):
+    status_code = 409
+
+
+def overlapping_bookings(teacher_id, start, end):
+    return LessonBooking.objects.filter(
+        teacher_id=teacher_id, status__in=ACTIVE_STATUSES,
+        start_datetime__lt=end, end_datetime__gt=start,
+    )
+
+
+def book_lesson(student, teacher, subject, start, end, index=None):
+    """Create a pending booking, refusing overlaps with the teacher's active bookings.
+
+    The teacher's ``TeacherIntervalIndex`` (pass ``index`` to reuse one you
+    already hold) rejects obvious conflicts before any lock is taken. The
+    authoritative check runs under the teacher lock, in the same transaction
+    as the 24h notice rule, and on Postgres the exclusion constraint backs it up.
+    """
+    teacher_id = teacher.pk
+    if index is None:
+        index = TeacherIntervalIndex.load([teacher_id], start, end)
+    if index.overlaps(teacher_id, start, end):
+        raise BookingConflict("This slot overlaps an existing booking")
+
+    with transaction.atomic():
+        if start < timezone.now() + MIN_NOTICE:
+            raise BookingError("Must book at least 24h in advance")
+        lock_teacher(teacher_id)
+        if overlapping_bookings(teacher_id, start, end).exists():
+            raise BookingConflict("This slot overlaps an existing booking")
+        try:
+            with transaction.atomic():
+                booking = LessonBooking.objects.create(
+                    student=student,
+                    teacher=teacher,
+                    subject=subject,
+                    start_datetime=start,
+                    end_datetime=end,
+                    status='pending',
+                )
+        except ValidationError as e:
+            raise BookingError(" ".join(e.messages))
+        except IntegrityError as e:
+            if OVERLAP_CONSTRAINT in str(e):
+                raise BookingConflict("This slot overlaps an existing booking")
+            raise
+    index.add(teacher_id, start, end)
+    return booking
+
+
+def set_pending_status(user, booking_ids, status):
+    """Move pending bookings to ``status`` with a single conditional UPDATE.
+
+    Only bookings that are still pending and belong to ``user`` (any teacher's,
+    for staff) are touched, so concurrent approve/reject calls can't both win.
+    Returns ``{booking_id: outcome}`` with outcome one of ``updated``,
+    ``not_found``, ``forbidden`` or ``not_pending``.
+    """
+    ids = {int(pk) for pk in booking_ids}
+    allowed = LessonBooking.objects.filter(id__in=ids)
+    if not user.is_staff:
+        allowed = allowed.filter(teacher_id=user.pk)
+
+    with transaction.atomic():
+        if not connection.features.has_select_for_update:
+            # SQLite has no row locks: a no-op write takes the database write lock
+            # now, so the statuses read below still hold when the UPDATE runs
+            LessonBooking.objects.filter(id__in=ids).update(status=F('status'))
+        rows = list(LessonBooking.objects.select_for_update().filter(id__in=ids)
+                    .values_list('id', 'teacher_id', 'status', 'student_id', 'start_datetime', 'end_datetime'))
+        current = {pk: (teacher_id, current_status) for pk, teacher_id, current_status, *_ in rows}
+        outcomes = {}
+        for pk in ids:
+            if pk not in current:
+                outcomes[pk] = 'not_found'
+            elif not user.is_staff and current[pk][0] != user.pk:
+                outcomes[pk] = 'forbidden'
+            elif current[pk][1] != 'pending':
+                outcomes[pk] = 'not_pending'
+        candidates = ids - outcomes.keys()
+        if candidates:
+            # the rows are locked, so every candidate is still pending
+            allowed.filter(id__in=candidates, status='pending').update(status=status)
+        outcomes.update({pk: 'updated' for pk in candidates})
+        # QuerySet.update() sends no signals, so invalidate the cached dashboards here
+        changed = [row for row in rows if outcomes.get(row[0]) == 'updated']
+        bump_users(*(uid for _, teacher_id, _, student_id, *_ in changed for uid in (teacher_id, student_id)))
+        if changed and status not in ACTIVE_STATUSES:
+            # a rejection frees the teacher's materialized slots again; recompute
+            # them under the teacher lock so a booking made meanwhile isn't lost
+            teacher_ids = {row[1] for row in changed}
+            lock_teachers(teacher_ids)
+            mark_booked(teacher_ids, min(row[4] for row in changed), max(row[5] for row in changed))
+        # notifications and audit records go out after commit (core/outbox.py)
+        enqueue_many('booking.status_changed', [{"booking": pk, "status": status, "actor": user.pk}
+                                                 for pk in sorted(ids) if outcomes.get(pk) == 'updated'])
+    return outcomes
@@ -0,0 +1,227 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .intervals import TeacherIntervalIndex
+from .locks import lock_teacher, lock_teachers
+from .models import AvailabilitySlot, LessonBooking, TeacherAvailability
+
+
+def occurrence(availability, day):
+    """Aware (start, end) of ``availability`` on ``day`` (which must be its weekday)."""
+    start = timezone.make_aware(datetime.combine(day, availability.start_time))
+    end = timezone.make_aware(datetime.combine(day, availability.end_time))
+    return start, end
+
+
+def ceil_to(dt, step):
+    """Round ``dt`` up to the next multiple of ``step`` (e.g. 15 minutes)."""
+    remainder = (dt - dt.replace(hour=0, minute=0, second=0, microsecond=0)) % step
+    return dt + (step - remainder) if remainder else dt
+
+
+def expand_windows(availabilities, date_from, date_to):
+    """Weekly windows as ``{teacher_id: [(start, end, availability), ...]}``, sorted by start.
+
+    Covers every occurrence whose date falls in ``[date_from, date_to]``.
+    """
+    tz = timezone.get_current_timezone()
+    aware = {}  # most teachers share start/end times, so build each datetime once
+
+    def at(day, t):
+        key = (day, t)
+        if key not in aware:
+            # same tzinfo as datetimes read from the DB, so comparisons stay on the fast path
+            aware[key] = timezone.make_aware(datetime.combine(day, t), tz).astimezone(dt_timezone.utc)
+        return aware[key]
+
+    windows = defaultdict(list)
+    week = timedelta(days=7)
+    for a in availabilities:
+        day = date_from + timedelta(days=(a.weekday - date_from.weekday()) % 7)
+        while day <= date_to:
+            windows[a.teacher_id].append((at(day, a.start_time), at(day, a.end_time), a))
+            day += week
+    for teacher_windows in windows.values():
+        teacher_windows.sort(key=lambda w: w[0])
+    return windows
+
+
+def subtract(windows, busy):
+    """Free parts of ``windows`` once ``busy`` is removed, in one sorted sweep.
+
+    ``windows`` is ``[(start, end, ref)]`` and ``busy`` is ``[(start, end)]``,
+    both sorted by start. Returns ``[(start, end, ref)]``.
+    """
+    free = []
+    j = 0
+    for w_start, w_end, ref in windows:
+        # busy intervals that ended before this window can't touch later ones either
+        while j < len(busy) and busy[j][1] <= w_start:
+            j += 1
+        cursor = w_start
+        k = j
+        while k < len(busy) and busy[k][0] < w_end:
+            b_start, b_end = busy[k]
+            if b_start > cursor:
+                free.append((cursor, b_start, ref))
+            cursor = max(cursor, b_end)
+            k += 1
+        if cursor < w_end:
+            free.append((cursor, w_end, ref))
+    return free
+
+
+def open_slots(subject_id, date_from, date_to, min_length=timedelta(hours=1), not_before=None, teacher_id=None):
+    """Bookable intervals for ``subject_id`` across all teachers, in two queries.
+
+    Recurring availability is expanded over the date range and every active
+    (pending/approved) booking the teacher holds in that range, for any
+    subject, is cut out. Intervals shorter than ``min_length`` or starting
+    before ``not_before`` are dropped/clipped.
+    """
+    availabilities = TeacherAvailability.objects.filter(subject_id=subject_id).select_related('teacher')
+    if teacher_id is not None:
+        availabilities = availabilities.filter(teacher_id=teacher_id)
+    windows = expand_windows(availabilities, date_from, date_to)
+    if not windows:
+        return []
+
+    range_start = min(w[0][0] for w in windows.values())
+    range_end = max(end for w in windows.values() for _, end, _ in w)
+    index = TeacherIntervalIndex.load(list(windows), range_start, range_end)
+
+    slots = []
+    for t_id, teacher_windows in windows.items():
+        for start, end, availability in subtract(teacher_windows, index.busy(t_id)):
+            if not_before is not None and start < not_before:
+                start = not_before
+            if end - start >= min_length:
+                slots.append((start, end, availability))
+    slots.sort(key=lambda s: (s[0], s[2].teacher_id))
+    return slots
+
+
+# Materialized slots. ``open_slots`` answers arbitrary-length searches by
+# expanding the weekly windows per request; ``AvailabilitySlot`` rows hold
+# the same windows cut into fixed-length slots for the next
+# ``AVAILABILITY_SLOT_WEEKS`` weeks, so a day's free slots are one indexed
+# query (``free_slots``). ``materialize_slots`` rebuilds them (run it daily
+# to roll the horizon forward); the receivers below keep them current.
+
+def slot_length():
+    return timedelta(minutes=getattr(settings, "AVAILABILITY_SLOT_MINUTES", 60))
+
+
+def horizon(weeks=None, today=None):
+    """``(start, end)`` datetimes of the materialized range: today's midnight plus ``weeks``."""
+    weeks = getattr(settings, "AVAILABILITY_SLOT_WEEKS", 8) if weeks is None else weeks
+    start = timezone.make_aware(datetime.combine(today or timezone.localdate(), time.min))
+    return start, start + timedelta(weeks=weeks)
+
+
+def build_slots(availabilities, start, end):
+    """Unsaved ``AvailabilitySlot`` rows for ``availabilities`` in ``[start, end)``, booked flags set."""
+    windows = expand_windows(availabilities, timezone.localdate(start), timezone.localdate(end) - timedelta(days=1))
+    if not windows:
+        return []
+    index = TeacherIntervalIndex.load(list(windows), start, end)
+    length = slot_length()
+    slots = []
+    for teacher_id, teacher_windows in windows.items():
+        for w_start, w_end, a in teacher_windows:
+            while w_start + length <= w_end:
+                slots.append(AvailabilitySlot(
+                    availability_id=a.id, teacher_id=teacher_id, subject_id=a.subject_id,
+                    start_datetime=w_start, end_datetime=w_start + length,
+                    booked=index.overlaps(teacher_id, w_start, w_start + length)))
+                w_start += length
+    return slots
+
+
+def _insert(slots, batch_size):
+    it = iter(slots)
+    n = 0
+    while batch := list(islice(it, batch_size)):
+        AvailabilitySlot.objects.bulk_create(batch)
+        n += len(batch)
+    return n
+
+
+def prune():
+    """Delete slots that ended before today; returns how many."""
+    return AvailabilitySlot.objects.filter(end_datetime__lte=horizon(0)[0]).delete()[0]
+
+
+def materialize(teacher_ids=None, weeks=None, batch_size=5000):
+    """Rebuild the slots of ``teacher_ids`` (everyone by default) from today; returns rows written."""
+    start, end = horizon(weeks)
+    availabilities = TeacherAvailability.objects.all()
+    current = AvailabilitySlot.objects.filter(end_datetime__gt=start)
+    if teacher_ids is not None:
+        availabilities = availabilities.filter(teacher_id__in=teacher_ids)
+        current = current.filter(teacher_id__in=teacher_ids)
+    with transaction.atomic():
+        # booked flags are read after the teacher locks, so a booking can't land in between
+        lock_teachers(teacher_ids if teacher_ids is not None
+                      else availabilities.values_list('teacher_id', flat=True).distinct())
+        current.delete()
+        return _insert(build_slots(availabilities, start, end), batch_size)
+
+
+def rematerialize_availability(availability):
+    """Regenerate one availability's slots, leaving the rest of the teacher's week alone."""
+    start, end = horizon()
+    with transaction.atomic():
+        lock_teacher(availability.teacher_id)
+        AvailabilitySlot.objects.filter(availability_id=availability.pk, end_datetime__gt=start).delete()
+        AvailabilitySlot.objects.bulk_create(build_slots([availability], start, end))
+
+
+def mark_booked(teacher_ids, start, end):
+    """Recompute ``booked`` for the teachers' slots overlapping ``[start, end)`` (two queries)."""
+    slots = list(AvailabilitySlot.objects
+                 .filter(teacher_id__in=teacher_ids, start_datetime__lt=end, end_datetime__gt=start)
+                 .values_list('id', 'teacher_id', 'start_datetime', 'end_datetime', 'booked'))
+    if not slots:
+        return
+    index = TeacherIntervalIndex.load(teacher_ids, start, end)
+    changed = {True: [], False: []}
+    for pk, teacher_id, s_start, s_end, booked in slots:
+        now_booked = index.overlaps(teacher_id, s_start, s_end)
+        if now_booked != booked:
+            changed[now_booked].append(pk)
+    for booked, ids in changed.items():
+        if ids:
+            AvailabilitySlot.objects.filter(id__in=ids).update(booked=booked)
+
+
+def free_slots(subject_id, start, end, teacher_id=None):
+    """Free materialized slots for ``subject_id`` starting in ``[start, end)``, in start order."""
+    qs = (AvailabilitySlot.objects
+          .filter(subject_id=subject_id, booked=False, start_datetime__gte=start, start_datetime__lt=end)
+          .select_related('teacher').order_by('start_datetime', 'teacher_id'))
+    if teacher_id is not None:
+        qs = qs.filter(teacher_id=teacher_id)
+    return qs
+
+
+@receiver(post_save, sender=TeacherAvailability)
+def _availability_saved(sender, instance, raw=False, **kwargs):
+    # deleting an availability cascades to its slots
+    if not raw:
+        rematerialize_availability(instance)
+
+
+@receiver(post_save, sender=LessonBooking)
+@receiver(post_delete, sender=LessonBooking)
+def _booking_changed(sender, instance, raw=False, **kwargs):
+    # lesson times never change after booking, so only this booking's span can flip
+    if not raw:
+        mark_booked([instance.teacher_id], instance.start_datetime, instance.end_datetime)
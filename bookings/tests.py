@@ -1,3 +1,263 @@
-from django.test import TestCase
+import threading
+from datetime import datetime, time, timedelta
+from io import StringIO
+from time import sleep
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import OutboxMessage
+from subjects.models import Subject, TeacherSubject, UserSubject
+from .intervals import TeacherIntervalIndex
+from .locks import lock_teacher
+from .models import AvailabilitySlot, LessonBooking, TeacherAvailability
+from .services import BookingConflict, BookingError, book_lesson, set_pending_status
+from .slots import free_slots, materialize
+
+
+def make_people(n_students=1):
+    teacher = User.objects.create(username="teacher")
+    teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+    subject = Subject.objects.create(code="GCSE-MATH", name="GCSE Maths")
+    TeacherSubject.objects.create(teacher=teacher, subject=subject)
+    students = []
+    for i in range(n_students):
+        student = User.objects.create(username=f"student{i}")
+        student.groups.add(Group.objects.get_or_create(name="student")[0])
+        UserSubject.objects.create(user=student, subject=subject)
+        students.append(student)
+    return teacher, subject, students
+
+
+class IntervalIndexTests(TestCase):
+    def test_half_open_intervals(self):
+        t0 = timezone.now()
+        index = TeacherIntervalIndex()
+        index.add(1, t0, t0 + timedelta(hours=3))
+        index.add(1, t0 + timedelta(hours=1), t0 + timedelta(hours=2))
+        self.assertTrue(index.overlaps(1, t0 + timedelta(hours=2), t0 + timedelta(hours=4)))
+        self.assertFalse(index.overlaps(1, t0 + timedelta(hours=3), t0 + timedelta(hours=4)))
+        self.assertFalse(index.overlaps(2, t0, t0 + timedelta(hours=1)))
+
+
+class BookLessonTests(TestCase):
+    def setUp(self):
+        self.teacher, self.subject, (self.student,) = make_people()
+        self.start = timezone.now() + timedelta(days=2)
+
+    def test_overlap_is_rejected(self):
+        book_lesson(self.student, self.teacher, self.subject, self.start, self.start + timedelta(hours=1))
+        with self.assertRaises(BookingConflict):
+            book_lesson(self.student, self.teacher, self.subject,
+                        self.start + timedelta(minutes=30), self.start + timedelta(hours=2))
+        # back-to-back is fine
+        book_lesson(self.student, self.teacher, self.subject,
+                    self.start + timedelta(hours=1), self.start + timedelta(hours=2))
+
+    def test_rejected_booking_frees_the_slot(self):
+        booking = book_lesson(self.student, self.teacher, self.subject, self.start, self.start + timedelta(hours=1))
+        LessonBooking.objects.filter(pk=booking.pk).update(status='rejected')
+        book_lesson(self.student, self.teacher, self.subject, self.start, self.start + timedelta(hours=1))
+
+    def test_24h_notice(self):
+        soon = timezone.now() + timedelta(hours=2)
+        with self.assertRaises(BookingError):
+            book_lesson(self.student, self.teacher, self.subject, soon, soon + timedelta(hours=1))
+
+    def test_slot_search_rejects_bad_durations(self):
+        self.client.force_login(self.student)
+        for duration in ("0", "-1", "inf", "nan", "1e308", "25", "x"):
+            response = self.client.get(reverse("api_slots"), {"subject": self.subject.id, "duration": duration})
+            self.assertEqual(response.status_code, 400, duration)
+        response = self.client.get(reverse("api_slots"), {"subject": self.subject.id, "duration": "1.5"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_booking_request_rejects_bad_durations(self):
+        day = timezone.localdate() + timedelta(days=3)
+        availability = TeacherAvailability.objects.create(teacher=self.teacher, subject=self.subject,
+                                                          weekday=day.weekday(), start_time=time(9),
+                                                          end_time=time(12))
+        start = timezone.make_aware(datetime.combine(day, time(9))).isoformat()
+        self.client.force_login(self.student)
+        for name in ("api_request_booking", "api_async_request_booking"):
+            for duration in ("abc", "0", -1, 1.5, "1e400", 10 ** 30, 25, None):
+                with self.subTest(name, duration=duration):
+                    response = self.client.post(reverse(name), {"availability_id": availability.id, "start": start,
+                                                                "duration": duration},
+                                                content_type="application/json")
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()["error"], "duration must be a whole number of hours from 1 to 24")
+        response = self.client.post(reverse("api_request_booking"),
+                                    {"availability_id": availability.id, "start": start, "duration": "2"},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+
+class AvailabilitySlotTests(TestCase):
+    def setUp(self):
+        self.teacher, self.subject, (self.student,) = make_people()
+        self.day = timezone.localdate() + timedelta(days=3)
+        self.availability = TeacherAvailability.objects.create(
+            teacher=self.teacher, subject=self.subject, weekday=self.day.weekday(),
+            start_time=time(9), end_time=time(12))
+
+    def at(self, hour, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour)))
+
+    def free_hours(self, subject=None, day=None):
+        start = self.at(0, day)
+        return [s.start_datetime.hour for s in free_slots((subject or self.subject).id, start,
+                                                          start + timedelta(days=1))]
+
+    def test_saving_availability_materializes_the_horizon(self):
+        # 8 weeks hold exactly 8 of each weekday, 3 one-hour slots each
+        self.assertEqual(AvailabilitySlot.objects.filter(availability=self.availability).count(), 24)
+        self.assertEqual(self.free_hours(), [9, 10, 11])
+        self.assertEqual(self.free_hours(day=self.day + timedelta(weeks=1)), [9, 10, 11])
+
+    def test_editing_one_availability_leaves_the_others_alone(self):
+        other = TeacherAvailability.objects.create(teacher=self.teacher, subject=self.subject,
+                                                   weekday=(self.day.weekday() + 1) % 7,
+                                                   start_time=time(14), end_time=time(16))
+        others = set(AvailabilitySlot.objects.filter(availability=other).values_list("id", flat=True))
+        self.availability.end_time = time(10)
+        self.availability.save()
+        self.assertEqual(self.free_hours(), [9])
+        self.assertEqual(set(AvailabilitySlot.objects.filter(availability=other).values_list("id", flat=True)),
+                         others)
+        self.availability.delete()
+        self.assertEqual(self.free_hours(), [])
+
+    def test_booking_status_marks_slots_booked_and_free(self):
+        booking = book_lesson(self.student, self.teacher, self.subject,
+                              self.at(10), self.at(10) + timedelta(minutes=90))
+        self.assertEqual(self.free_hours(), [9])
+        # slots are recomputed under the teacher lock, like a new booking
+        with mock.patch("bookings.locks.lock_teacher", wraps=lock_teacher) as lock:
+            set_pending_status(self.teacher, [booking.id], "rejected")
+        lock.assert_called_once_with(self.teacher.id)
+        self.assertEqual(self.free_hours(), [9, 10, 11])
+
+        # the teacher's time is taken whatever the subject
+        physics = Subject.objects.create(code="GCSE-PHY", name="GCSE Physics")
+        TeacherSubject.objects.create(teacher=self.teacher, subject=physics)
+        book_lesson(self.student, self.teacher, physics, self.at(11), self.at(12))
+        self.assertEqual(self.free_hours(), [9, 10])
+
+    def test_rebuilds_lock_the_teacher_before_reading_bookings(self):
+        slots_at_lock = []
+
+        def lock(teacher_id):
+            lock_teacher(teacher_id)
+            slots_at_lock.append(AvailabilitySlot.objects.filter(teacher_id=teacher_id).count())
+
+        with mock.patch("bookings.locks.lock_teacher", side_effect=lock), \
+                mock.patch("bookings.slots.lock_teacher", side_effect=lock):
+            materialize()
+            self.availability.save()
+        # both rebuilds locked while the old slots were still there
+        self.assertEqual(slots_at_lock, [24, 24])
+
+    def test_day_search_is_one_indexed_query(self):
+        with self.assertNumQueries(1):
+            slots = list(free_slots(self.subject.id, self.at(0), self.at(0) + timedelta(days=1)))
+            self.assertEqual(slots[0].teacher.username, "teacher")
+
+    def test_rebuild_after_bulk_writes(self):
+        # bulk_create skips the receivers; materialize_slots catches up
+        LessonBooking.objects.bulk_create([LessonBooking(student=self.student, teacher=self.teacher,
+                                                         subject=self.subject, start_datetime=self.at(9),
+                                                         end_datetime=self.at(10), status="approved")])
+        self.assertEqual(self.free_hours(), [9, 10, 11])
+        out = StringIO()
+        call_command("materialize_slots", "--weeks", "2", stdout=out)
+        self.assertIn("Materialized 6 slots for 1 teachers", out.getvalue())
+        self.assertEqual(self.free_hours(), [10, 11])
+        self.assertEqual(materialize([self.teacher.id]), 24)
+
+    def test_day_slots_endpoint(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse("api_day_slots"), {"subject": self.subject.id, "date": self.day})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s["availability_id"] for s in response.json()], [self.availability.id] * 3)
+        self.assertEqual(self.client.get(reverse("api_day_slots"), {"subject": self.subject.id}).status_code, 400)
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Needs a database the threads can share: PostgreSQL, or SQLite on a file
+    (``DATABASE_URL=sqlite:///...`` tests on one, see settings._database)."""
+    n_threads = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("threads need a shared on-disk or server database")
+
+    def test_exactly_one_parallel_request_wins(self):
+        teacher, subject, students = make_people(self.n_threads)
+        start = timezone.now() + timedelta(days=3)
+        barrier = threading.Barrier(self.n_threads)
+        outcomes = []
+        create = LessonBooking.objects.create
+
+        def slow_create(**kwargs):
+            # hold every thread between the overlap check and the insert, so an
+            # unlocked check would let them all through
+            sleep(0.05)
+            return create(**kwargs)
+
+        def attempt(student):
+            try:
+                barrier.wait()
+                book_lesson(student, teacher, subject, start, start + timedelta(hours=1))
+                outcomes.append("booked")
+            except BookingConflict:
+                outcomes.append("conflict")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt, args=(s,)) for s in students]
+        with mock.patch.object(LessonBooking.objects, "create", side_effect=slow_create):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(outcomes.count("booked"), 1)
+        self.assertEqual(outcomes.count("conflict"), self.n_threads - 1)
+        self.assertEqual(LessonBooking.objects.filter(teacher=teacher).count(), 1)
+
+    def test_exactly_one_parallel_approval_wins(self):
+        teacher, subject, (student,) = make_people()
+        start = timezone.now() + timedelta(days=3)
+        booking = book_lesson(student, teacher, subject, start, start + timedelta(hours=1))
+        barrier = threading.Barrier(self.n_threads)
+        outcomes = []
+
+        def slow_read(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith("SELECT") and "bookings_lessonbooking" in sql:
+                sleep(0.05)  # between reading the statuses and the UPDATE
+            return result
+
+        def attempt():
+            try:
+                barrier.wait()
+                with connection.execute_wrapper(slow_read):
+                    outcomes.append(set_pending_status(teacher, [booking.id], "approved")[booking.id])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=attempt) for _ in range(self.n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(outcomes.count("updated"), 1)
+        self.assertEqual(outcomes.count("not_pending"), self.n_threads - 1)
+        self.assertEqual(OutboxMessage.objects.filter(kind="booking.status_changed").count(), 1)
@@ -1,6 +1,18 @@
 from django.contrib import admin
-from .models import Profile
+from .models import AuditRecord, OutboxMessage, Profile
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "dob", "parent_email", "under_16")
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("kind", "status", "attempts", "available_at", "created_at", "processed_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("last_error",)
+
+@admin.register(AuditRecord)
+class AuditRecordAdmin(admin.ModelAdmin):
+    list_display = ("action", "user", "actor", "created_at")
+    list_filter = ("action",)
+    search_fields = ("user__username", "actor__username")
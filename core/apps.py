@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import roles  # noqa: F401  (connects the group-change receiver)
+        from . import auth_backends  # noqa: F401  (connects the user-change receivers)
+        from . import versions  # noqa: F401  (connects the page-version receivers)
+        from . import query_metrics  # noqa: F401  (wraps new connections)
+        from . import notifications  # noqa: F401  (registers the outbox handlers)
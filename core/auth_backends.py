@@ -0,0 +1,105 @@
+"""Load the signed-in user from the cache instead of the database.
+
+``CachedModelBackend`` is ``ModelBackend`` with ``get_user`` answered from
+the cache: the user row under ``auth:user:<id>`` and the role names kept by
+``core.roles``, fetched in one ``get_many``. Together with the ``cached_db``
+session engine, an authenticated request reaches its view without a query.
+
+Entries are dropped whenever the user row is saved or deleted (now and
+again on commit, like ``core.versions.bump``), so a password change or
+deactivation takes effect on the next request. Group changes already
+invalidate the role names. Like the version counters, this needs a cache
+shared by every worker, so it is only on with ``USER_CACHE_ENABLED``.
+
+Plain ``ModelBackend`` stays listed after this one so older sessions still
+load. It would repeat a failed password check against the same table, so a
+failure here is final.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .roles import role_key
+
+User = get_user_model()
+
+USER_CACHE_TIMEOUT = getattr(settings, "USER_CACHE_TIMEOUT", 300)
+
+
+def enabled():
+    return getattr(settings, "USER_CACHE_ENABLED", False)
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def _cached(found, user_id):
+    user = found.get(_user_key(user_id))
+    if user is not None and role_key(user_id) in found:
+        user.role_names = frozenset(found[role_key(user_id)])
+    return user
+
+
+def _storable(user):
+    # the row only; role names have their own key and invalidation
+    user.__dict__.pop("role_names", None)
+    return user
+
+
+class CachedModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            raise PermissionDenied  # stops authenticate() before ModelBackend hashes it again
+        return user
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        user = await super().aauthenticate(request, username, password, **kwargs)
+        if user is None and password is not None:
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        if not enabled():
+            return super().get_user(user_id)
+        user = _cached(cache.get_many([_user_key(user_id), role_key(user_id)]), user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_user_key(user_id), _storable(user), USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        if not enabled():
+            return await super().aget_user(user_id)
+        user = _cached(await cache.aget_many([_user_key(user_id), role_key(user_id)]), user_id)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(_user_key(user_id), _storable(user), USER_CACHE_TIMEOUT)
+        return user
+
+
+def invalidate_users(*user_ids):
+    """Drop the cached rows for ``user_ids`` (now and again on commit)."""
+    keys = [_user_key(uid) for uid in user_ids if uid]
+    if not keys:
+        return
+
+    def drop():
+        cache.delete_many(keys)
+
+    drop()
+    transaction.on_commit(drop)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _user_changed(sender, instance, **kwargs):
+    invalidate_users(instance.pk)
@@ -0,0 +1,154 @@
+"""Send read-only request traffic to the read replicas.
+
+Replicas are the aliases listed in ``settings.REPLICA_DATABASES`` (built
+from ``DATABASE_REPLICA_URLS``). ``ReplicaRoutingMiddleware`` marks GET and
+HEAD requests as replica-eligible. Everything else reads from ``default``:
+unsafe methods, management commands and workers, code inside a
+transaction, and the rest of any request that has written.
+
+Read-your-writes: after a user writes, the middleware sets a short-lived
+cookie that keeps their reads on the primary for ``REPLICA_PIN_SECONDS``,
+which should comfortably exceed replica lag. Pages and ETags in
+``core.versions`` are keyed on version tokens, so a request that sees a
+token younger than that window also reads from the primary (see
+``pin_to_primary``). Otherwise it could cache a lagging replica's data under
+the new version.
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+PIN_COOKIE = "db_pin"
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+class RoutingState:
+    """Per-request routing flags, shared by every thread serving the request."""
+
+    def __init__(self, replica_ok):
+        self.replica_ok = replica_ok
+        self.wrote = False
+
+
+def replicas():
+    return list(getattr(settings, "REPLICA_DATABASES", ()))
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+def _count(name):
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+def start_request(replica_ok):
+    """Route the current request's reads; returns the token for ``end_request``."""
+    return _state.set(RoutingState(replica_ok and bool(replicas())))
+
+
+def end_request(token):
+    state = _state.get()
+    _state.reset(token)
+    return state
+
+
+def pin_to_primary(reason="pinned"):
+    """Read from the primary for the rest of the current request."""
+    state = _state.get()
+    if state is not None and state.replica_ok:
+        state.replica_ok = False
+        _count(f"pin:{reason}")
+
+
+def reading_from_replica():
+    state = _state.get()
+    return state is not None and state.replica_ok
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_ok:
+            _count(f"read:{DEFAULT_DB_ALIAS}")
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # reads inside a transaction must see its own writes
+            _count(f"read:{DEFAULT_DB_ALIAS}")
+            return DEFAULT_DB_ALIAS
+        alias = random.choice(replicas())
+        _count(f"read:{alias}")
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            state.replica_ok = False
+        _count(f"write:{DEFAULT_DB_ALIAS}")
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@receiver(connection_created)
+def _connection_opened(sender, connection, **kwargs):
+    _count(f"connect:{connection.alias}")
+
+
+def pool_stats(alias):
+    """psycopg pool statistics for ``alias``, or None when it isn't pooled."""
+    conn = connections[alias]
+    if not conn.settings_dict.get("OPTIONS", {}).get("pool"):
+        return None
+    pool = conn.pool
+    return pool.get_stats() if pool is not None else None
+
+
+def db_metrics():
+    """Routing and connection counters since start, plus pool stats.
+
+    Shape: ``{"reads": {alias: n}, "writes": {...}, "connects": {...},
+    "pins": {reason: n}, "pools": {alias: stats}}``.
+    """
+    with _metrics_lock:
+        counts = dict(_metrics)
+    out = {"reads": {}, "writes": {}, "connects": {}, "pins": {}, "pools": {}}
+    section = {"read": "reads", "write": "writes", "connect": "connects", "pin": "pins"}
+    for key, value in counts.items():
+        kind, name = key.split(":", 1)
+        out[section[kind]][name] = value
+    for alias in connections:
+        stats = pool_stats(alias)
+        if stats is not None:
+            out["pools"][alias] = stats
+    return out
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+def pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
@@ -0,0 +1,163 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.models import Group
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from importlib import import_module
+
+from bookings.models import LessonBooking
+from subjects.models import Subject, TeacherSubject, UserSubject
+
+User = get_user_model()
+
+ENDPOINTS = {
+    "me": ("/api/me/", "/api/async/me/"),
+    "my_subjects": ("/api/my-subjects/", "/api/async/my-subjects/"),
+    "my_bookings": ("/api/bookings/mine/", "/api/async/bookings/mine/"),
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare sync (WSGI, thread pool) and async (ASGI, one event loop) throughput of the "
+            "API read endpoints, with every SQL query delayed to simulate a slow database")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="my_bookings")
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=20,
+                            help="requests in flight; also the sync thread-pool size")
+        parser.add_argument("--db-latency-ms", type=float, default=20,
+                            help="added to every query (0 to measure raw overhead)")
+        parser.add_argument("--bookings", type=int, default=30)
+
+    def handle(self, *args, **opts):
+        student, cookie = self.seed(opts["bookings"])
+        host = next((h for h in settings.ALLOWED_HOSTS if h and "*" not in h and not h.startswith(".")),
+                    "localhost")
+        sync_path, async_path = ENDPOINTS[opts["endpoint"]]
+        latency = opts["db_latency_ms"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_query)
+
+        connections.close_all()
+        if latency:
+            connection_created.connect(add_latency)
+        try:
+            results = [
+                ("sync  (WSGI, %d threads)" % opts["concurrency"],
+                 self.run_sync(sync_path, host, cookie, opts["requests"], opts["concurrency"])),
+                ("async (ASGI, 1 loop)",
+                 asyncio.run(self.run_async(async_path, host, cookie, opts["requests"], opts["concurrency"]))),
+            ]
+        finally:
+            connection_created.disconnect(add_latency)
+            connections.close_all()
+            User.objects.filter(pk__in=[student.pk, self.teacher.pk]).delete()
+            self.subject.delete()
+
+        self.stdout.write(f"{opts['endpoint']}: {opts['requests']} requests, concurrency {opts['concurrency']}, "
+                          f"+{opts['db_latency_ms']:g} ms per query")
+        for label, (elapsed, latencies, statuses) in results:
+            bad = sum(1 for s in statuses if s != 200)
+            latencies.sort()
+            self.stdout.write(
+                f"  {label:26} {len(latencies) / elapsed:8.1f} req/s   "
+                f"p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+                f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms"
+                + (self.style.ERROR(f"   {bad} non-200") if bad else ""))
+
+    def seed(self, n_bookings):
+        stamp = timezone.now().strftime("%Y%m%d%H%M%S%f")
+        self.subject = Subject.objects.create(code=f"BENCH-{stamp}", name=f"Bench {stamp}")
+        self.teacher = User.objects.create_user(f"bench-t-{stamp}")
+        self.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        student = User.objects.create_user(f"bench-s-{stamp}")
+        student.groups.add(Group.objects.get_or_create(name="student")[0])
+        TeacherSubject.objects.create(teacher=self.teacher, subject=self.subject)
+        UserSubject.objects.create(user=student, subject=self.subject)
+        start = timezone.now() + timedelta(days=2)
+        LessonBooking.objects.bulk_create([
+            LessonBooking(student=student, teacher=self.teacher, subject=self.subject,
+                          start_datetime=start + timedelta(hours=2 * i),
+                          end_datetime=start + timedelta(hours=2 * i + 1))
+            for i in range(n_bookings)
+        ])
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store[SESSION_KEY] = str(student.pk)
+        store[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        store[HASH_SESSION_KEY] = student.get_session_auth_hash()
+        store.save()
+        return student, f"{settings.SESSION_COOKIE_NAME}={store.session_key}"
+
+    def run_sync(self, path, host, cookie, n, concurrency):
+        app = get_wsgi_application()
+
+        def one(_):
+            environ = {
+                "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+                "SERVER_NAME": host, "SERVER_PORT": "443", "HTTP_HOST": host, "HTTP_COOKIE": cookie,
+                "HTTP_X_FORWARDED_PROTO": "https", "wsgi.url_scheme": "https", "wsgi.input": BytesIO(),
+                "wsgi.errors": BytesIO(), "wsgi.multithread": True, "wsgi.multiprocess": False,
+                "wsgi.run_once": False, "wsgi.version": (1, 0),
+            }
+            status = []
+            began = time.perf_counter()
+            body = app(environ, lambda s, headers, exc_info=None: status.append(int(s.split()[0])))
+            b"".join(body)
+            body.close()
+            return time.perf_counter() - began, status[0]
+
+        began = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            done = list(pool.map(one, range(n)))
+        return time.perf_counter() - began, [d[0] for d in done], [d[1] for d in done]
+
+    async def run_async(self, path, host, cookie, n, concurrency):
+        app = get_asgi_application()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "https", "path": path, "raw_path": path.encode(), "query_string": b"",
+                "root_path": "", "client": ("127.0.0.1", 0), "server": (host, 443),
+                "headers": [(b"host", host.encode()), (b"cookie", cookie.encode())],
+            }
+            sent = {"request": False}
+            status = []
+
+            async def receive():
+                if not sent["request"]:
+                    sent["request"] = True
+                    return {"type": "http.request", "body": b"", "more_body": False}
+                await asyncio.Event().wait()  # no disconnect; the handler cancels this
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+
+            async with gate:
+                began = time.perf_counter()
+                await app(scope, receive, send)
+                return time.perf_counter() - began, status[0]
+
+        began = time.perf_counter()
+        done = await asyncio.gather(*(one() for _ in range(n)))
+        return time.perf_counter() - began, [d[0] for d in done], [d[1] for d in done]
@@ -0,0 +1,211 @@
+import json
+import math
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from api import urls as api_urls
+from bookings.models import LessonBooking
+from core import query_metrics
+from core import urls as core_urls
+from homework.models import Submission, Task
+from subjects.models import UserSubject
+
+User = get_user_model()
+
+# endpoints that change data or end the session; a benchmark only reads
+SKIP = {
+    "logout": "ends the session",
+    "internal_metrics": "staff only",
+    "api_request_booking": "writes",
+    "api_bulk_booking_status": "writes",
+    "api_approve_booking": "writes",
+    "api_reject_booking": "writes",
+    "api_submission_upload_target": "POST only",
+    "api_token": "POST only",
+    "api_token_refresh": "POST only",
+    "api_confirm_submission": "writes",
+    "api_local_upload": "writes",
+    "api_async_request_booking": "writes",
+    "api_async_bulk_booking_status": "writes",
+    "api_async_approve_booking": "writes",
+    "api_async_reject_booking": "writes",
+    # the seeded files don't exist, so this would only time the MISSING.txt path
+    "teacher_task_submissions_zip": "seeded files are not in storage",
+}
+
+
+def url_names(patterns):
+    for p in patterns:
+        if isinstance(p, URLResolver):
+            yield from url_names(p.url_patterns)
+        elif isinstance(p, URLPattern) and p.name:
+            yield p.name, tuple(p.pattern.converters)
+
+
+def percentile(sorted_values, p):
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = ("Request every page in core/urls.py and api/urls.py as a representative teacher and "
+            "student and report p50/p95 latency, query count and response size as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teacher", help="username (default: <prefix>-t0, else the first teacher)")
+        parser.add_argument("--student", help="username (default: <prefix>-s0, else the first student)")
+        parser.add_argument("--prefix", default="load", help="seed_load prefix used to pick default users")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2, help="untimed requests first (fills caches)")
+        parser.add_argument("--only", nargs="*", help="URL names to run")
+        parser.add_argument("--output", help="write the JSON report here instead of stdout")
+        parser.add_argument("--compare", help="earlier report to diff against (printed to stderr)")
+
+    def handle(self, *args, **opts):
+        users = {
+            "teacher": self.pick_user(opts["teacher"], f"{opts['prefix']}-t0", "teacher"),
+            "student": self.pick_user(opts["student"], f"{opts['prefix']}-s0", "student"),
+        }
+        fixtures = self.fixtures(users)
+        clients = {}
+        for role, user in users.items():
+            clients[role] = Client(HTTP_HOST="localhost", raise_request_exception=False)
+            clients[role].force_login(user)
+
+        results, skipped = [], []
+        names = sorted(set(url_names(core_urls.urlpatterns)) | set(url_names(api_urls.urlpatterns)),
+                       key=lambda item: item[0])
+        # a sampling middleware would start its own collector and hide the queries from ours
+        with override_settings(QUERY_METRICS_SAMPLE_RATE=0):
+            for name, kwarg_names in names:
+                if opts["only"] and name not in opts["only"]:
+                    continue
+                if name in SKIP:
+                    skipped.append({"name": name, "reason": SKIP[name]})
+                    continue
+                for role in self.roles_for(name):
+                    try:
+                        kwargs = {k: fixtures[role][k] for k in kwarg_names}
+                    except KeyError as e:
+                        skipped.append({"name": name, "role": role, "reason": f"no {e.args[0]} in the data"})
+                        continue
+                    path = reverse(name, kwargs=kwargs)
+                    query = fixtures[role]["query"].get(name, {})
+                    results.append(self.bench(clients[role], name, role, path, query, opts))
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "versioned_cache": getattr(settings, "VERSIONED_CACHE_ENABLED", False),
+            "cache_backend": settings.CACHES["default"]["BACKEND"],
+            "dataset": {
+                "users": User.objects.count(),
+                "bookings": LessonBooking.objects.count(),
+                "tasks": Task.objects.count(),
+                "submissions": Submission.objects.count(),
+            },
+            "users": {role: user.username for role, user in users.items()},
+            "iterations": opts["iterations"],
+            "results": results,
+            "skipped": skipped,
+        }
+        text = json.dumps(report, indent=2)
+        if opts["output"]:
+            with open(opts["output"], "w") as f:
+                f.write(text + "\n")
+        else:
+            self.stdout.write(text)
+        if opts["compare"]:
+            self.compare(opts["compare"], results)
+
+    def pick_user(self, username, default_username, group):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user '{username}'.")
+        user = (User.objects.filter(username=default_username).first()
+                or User.objects.filter(groups__name=group).order_by("id").first())
+        if user is None:
+            raise CommandError(f"No {group} found; run seed_load first.")
+        return user
+
+    def fixtures(self, users):
+        teacher, student = users["teacher"], users["student"]
+        student_subjects = UserSubject.objects.filter(user=student).values_list("subject_id", flat=True)
+        teacher_task = Task.objects.filter(teacher=teacher).order_by("-created_at").first()
+        student_task = Task.objects.filter(subject_id__in=student_subjects).order_by("-created_at").first()
+        submission = Submission.objects.filter(teacher=teacher).order_by("-submitted_at").first()
+        subject_id = next(iter(student_subjects), None)
+        day = (timezone.localdate() + timedelta(days=2)).isoformat()  # past the 24h notice
+        fixtures = {"teacher": {"query": {}}, "student": {"query": {}}}
+        if teacher_task:
+            fixtures["teacher"]["task_id"] = teacher_task.id
+            fixtures["teacher"]["query"]["api_slots"] = {"subject": teacher_task.subject_id}
+            fixtures["teacher"]["query"]["api_day_slots"] = {"subject": teacher_task.subject_id, "date": day}
+        if submission:
+            fixtures["teacher"]["submission_id"] = submission.id
+        if student_task:
+            fixtures["student"]["task_id"] = student_task.id
+        if subject_id:
+            fixtures["student"]["query"]["api_slots"] = {"subject": subject_id}
+            fixtures["student"]["query"]["api_day_slots"] = {"subject": subject_id, "date": day}
+        return fixtures
+
+    def roles_for(self, name):
+        if "teacher" in name:
+            return ["teacher"]
+        if "student" in name:
+            return ["student"]
+        return ["student", "teacher"]
+
+    def bench(self, client, name, role, path, query, opts):
+        for _ in range(opts["warmup"]):
+            self.fetch(client, path, query)
+        timings, query_counts = [], []
+        for _ in range(opts["iterations"]):
+            with query_metrics.collect() as queries:
+                began = time.perf_counter()
+                status, size = self.fetch(client, path, query)
+                timings.append(time.perf_counter() - began)
+            query_counts.append(queries.count)
+        timings.sort()
+        return {
+            "name": name,
+            "role": role,
+            "path": path,
+            "status": status,
+            "p50_ms": round(percentile(timings, 0.5) * 1000, 2),
+            "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+            "mean_ms": round(statistics.fmean(timings) * 1000, 2),
+            "queries": int(statistics.median(query_counts)),
+            "bytes": size,
+        }
+
+    def fetch(self, client, path, query):
+        response = client.get(path, query)
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response.status_code, size
+
+    def compare(self, earlier_path, results):
+        with open(earlier_path) as f:
+            earlier = {(r["name"], r["role"]): r for r in json.load(f)["results"]}
+        sys.stderr.write(f"{'view':42} {'p50 ms':>20} {'queries':>12}\n")
+        for r in results:
+            old = earlier.get((r["name"], r["role"]))
+            if old is None:
+                continue
+            sys.stderr.write(f"{r['name'] + ' [' + r['role'] + ']':42} "
+                             f"{old['p50_ms']:>9} -> {r['p50_ms']:<8} {old['queries']:>4} -> {r['queries']:<4}\n")
@@ -0,0 +1,158 @@
+import re
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from bookings.models import LessonBooking
+from homework.models import Submission, Task
+from subjects.models import Subject, TeacherSubject, UserSubject
+
+User = get_user_model()
+
+# "SCAN <table>" without "USING ... INDEX" is a full table scan in SQLite plans
+SQLITE_SEQ_SCAN = re.compile(r"\bSCAN (\w+)(?! USING)")
+POSTGRES_SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+# an explicit sort means no index matches the ORDER BY
+SQLITE_SORT = re.compile(r"USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY")
+POSTGRES_SORT = re.compile(r"^\s*(?:->\s+)?Sort\b", re.M)
+
+
+class Command(BaseCommand):
+    help = ("EXPLAIN the main query of each view against a seeded dataset and "
+            "fail if any of them falls back to a sequential scan")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teachers", type=int, default=5)
+        parser.add_argument("--students", type=int, default=50)
+        parser.add_argument("--rows", type=int, default=200,
+                            help="bookings, tasks and submissions per teacher")
+        parser.add_argument("--no-seed", action="store_true",
+                            help="explain against the existing data instead of seeding")
+        parser.add_argument("--keep", action="store_true", help="commit the seeded rows")
+        parser.add_argument("--strict", action="store_true",
+                            help="also fail when a query needs an explicit sort")
+        parser.add_argument("--verbose-plans", action="store_true")
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            if opts["no_seed"]:
+                teacher = User.objects.filter(groups__name="teacher").first()
+                student = User.objects.filter(groups__name="student").first()
+                if not (teacher and student):
+                    raise CommandError("Need at least one teacher and one student; drop --no-seed.")
+            else:
+                teacher, student = self.seed(opts["teachers"], opts["students"], opts["rows"])
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                    # a small seed is cheaper to scan than to search; this asks
+                    # "is there a usable index?" rather than "is it used today?"
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+            failures = []
+            for label, qs in self.view_queries(teacher, student):
+                plan = qs.explain()
+                scans = self.seq_scans(plan)
+                sorted_in_memory = self.needs_sort(plan)
+                if opts["verbose_plans"]:
+                    self.stdout.write(f"--- {label}\n{plan}")
+                if scans:
+                    failures.append(label)
+                    self.stdout.write(self.style.ERROR(f"{label}: sequential scan on {', '.join(sorted(scans))}"))
+                elif sorted_in_memory:
+                    if opts["strict"]:
+                        failures.append(label)
+                    self.stdout.write(self.style.WARNING(f"{label}: index used, but results are sorted in memory"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{label}: ok"))
+
+            if not opts["keep"]:
+                transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"{len(failures)} view queries failed the plan check: {', '.join(failures)}")
+
+    def seq_scans(self, plan):
+        pattern = POSTGRES_SEQ_SCAN if connection.vendor == "postgresql" else SQLITE_SEQ_SCAN
+        return set(pattern.findall(plan))
+
+    def needs_sort(self, plan):
+        pattern = POSTGRES_SORT if connection.vendor == "postgresql" else SQLITE_SORT
+        return bool(pattern.search(plan))
+
+    def view_queries(self, teacher, student):
+        my_subject_ids = UserSubject.objects.filter(user=student).values_list("subject_id", flat=True)
+        task = Task.objects.filter(teacher=teacher).first()
+        return [
+            ("dashboard: subjects", Subject.objects.filter(usersubject__user=student)),
+            ("dashboard: bookings", LessonBooking.objects.filter(student=student)
+                .select_related("teacher", "subject").order_by("-created_at")[:20]),
+            ("teacher_dashboard: pending", LessonBooking.objects.filter(teacher=teacher, status="pending")
+                .select_related("student", "subject").order_by("start_datetime")),
+            ("teacher_dashboard: recent", LessonBooking.objects.filter(teacher=teacher)
+                .exclude(status="pending").select_related("student", "subject").order_by("-created_at")[:20]),
+            ("api my_bookings: teacher", LessonBooking.objects.filter(teacher=teacher)
+                .select_related("student", "teacher", "subject").order_by("-created_at", "-id")[:51]),
+            ("api my_bookings: student", LessonBooking.objects.filter(student=student)
+                .select_related("student", "teacher", "subject").order_by("-created_at", "-id")[:51]),
+            ("teacher_tasks", Task.objects.filter(teacher=teacher).select_related("subject").order_by("-created_at")),
+            ("student_tasks: tasks + latest submission", Task.objects.filter(subject_id__in=my_subject_ids)
+                .select_related("subject", "teacher")
+                .annotate(latest_submission_id=Subquery(
+                    Submission.objects.filter(student=student, task=OuterRef("pk"))
+                    .order_by("-submitted_at").values("id")[:1]))
+                .order_by("-created_at", "-id")[:20]),
+            ("student_submit: latest", Submission.objects.filter(student=student, task=task)
+                .order_by("-submitted_at")[:1]),
+            ("teacher_submissions", Submission.objects.filter(teacher=teacher)
+                .select_related("task", "student", "task__subject").order_by("-submitted_at", "-id")[:26]),
+            ("teacher_submissions: subject", Submission.objects.filter(teacher=teacher, task__subject=task.subject_id)
+                .select_related("task", "student", "task__subject").order_by("-submitted_at", "-id")[:26]),
+            ("teacher_task_submissions", Submission.objects.filter(task=task)
+                .select_related("student").order_by("-submitted_at", "-id")[:26]),
+            ("teacher_task_submissions_awaiting", Submission.objects.filter(task=task, feedback_text="")
+                .select_related("student").order_by("-submitted_at", "-id")[:26]),
+        ]
+
+    def seed(self, n_teachers, n_students, rows):
+        teacher_group, _ = Group.objects.get_or_create(name="teacher")
+        student_group, _ = Group.objects.get_or_create(name="student")
+        stamp = timezone.now().strftime("%Y%m%d%H%M%S%f")
+        subjects = Subject.objects.bulk_create(
+            [Subject(code=f"EXPL-{stamp}-{i}", name=f"Explain subject {i}") for i in range(4)])
+        teachers = User.objects.bulk_create(
+            [User(username=f"explain-t{i}-{stamp}") for i in range(n_teachers)])
+        students = User.objects.bulk_create(
+            [User(username=f"explain-s{i}-{stamp}") for i in range(n_students)])
+        Membership = User.groups.through
+        Membership.objects.bulk_create(
+            [Membership(user_id=u.id, group_id=teacher_group.id) for u in teachers]
+            + [Membership(user_id=u.id, group_id=student_group.id) for u in students])
+        TeacherSubject.objects.bulk_create(
+            [TeacherSubject(teacher=t, subject=s) for t in teachers for s in subjects])
+        UserSubject.objects.bulk_create(
+            [UserSubject(user=u, subject=subjects[i % len(subjects)]) for i, u in enumerate(students)])
+
+        now = timezone.now()
+        statuses = [code for code, _ in LessonBooking.STATUS_CHOICES]
+        bookings, tasks = [], []
+        for t in teachers:
+            for i in range(rows):
+                start = now + timedelta(days=1 + i // 8, hours=i % 8)
+                bookings.append(LessonBooking(
+                    student=students[i % len(students)], teacher=t, subject=subjects[i % len(subjects)],
+                    start_datetime=start, end_datetime=start + timedelta(hours=1),
+                    status=statuses[i % len(statuses)]))
+                tasks.append(Task(teacher=t, subject=subjects[i % len(subjects)], title=f"Task {i}"))
+        LessonBooking.objects.bulk_create(bookings, batch_size=1000)
+        tasks = Task.objects.bulk_create(tasks, batch_size=1000)
+        Submission.objects.bulk_create(
+            [Submission(task=task, student=students[i % len(students)], teacher_id=task.teacher_id,
+                        file=f"submissions/explain-{i}.pdf")
+             for i, task in enumerate(tasks)], batch_size=1000)
+        return teachers[0], students[0]
@@ -0,0 +1,50 @@
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = ("Deliver outbox messages (booking and submission notifications, audit records): claim due "
+            "batches with SELECT ... FOR UPDATE SKIP LOCKED and run them on a thread pool, retrying failures "
+            "with backoff. Safe to run several at once.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--threads", type=int, default=4, help="handler threads (each holds a DB connection)")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="seconds to sleep when idle")
+        parser.add_argument("--max-attempts", type=int, default=outbox.MAX_ATTEMPTS,
+                            help="failures before a message is marked dead")
+        parser.add_argument("--once", action="store_true", help="deliver what is due now, then exit")
+
+    def handle(self, *args, **opts):
+        if opts["once"]:
+            totals = outbox.drain(opts["batch_size"], opts["threads"], opts["max_attempts"])
+            self.stdout.write(self.report(totals))
+            return
+
+        self.stopping = False
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+        self.stdout.write(f"Outbox worker started ({opts['threads']} threads).")
+        with ThreadPoolExecutor(max_workers=opts["threads"], thread_name_prefix="outbox") as pool:
+            while not self.stopping:
+                close_old_connections()
+                messages = outbox.claim(opts["batch_size"])
+                if not messages:
+                    time.sleep(opts["poll_interval"])
+                    continue
+                # finish the claimed batch even when stopping, so its lease isn't left to expire
+                totals = outbox.dispatch(messages, pool, opts["max_attempts"])
+                self.stdout.write(self.report(totals))
+        self.stdout.write("Outbox worker stopped.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def report(self, totals):
+        return ", ".join(f"{n} {status}" for status, n in sorted(totals.items())) or "Nothing due."
@@ -0,0 +1,41 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core import seeding
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("Generate synthetic teachers, students, availability, bookings, tasks and submissions "
+            "in bulk (e.g. --teachers 2000 --students 100000 --bookings 2000000)")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teachers", type=int, default=20)
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--bookings", type=int, default=2000)
+        parser.add_argument("--availability-per-teacher", type=int, default=5)
+        parser.add_argument("--tasks-per-teacher", type=int, default=10)
+        parser.add_argument("--submissions", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="load", help="usernames are <prefix>-t<n> and <prefix>-s<n>")
+        parser.add_argument("--password", default=seeding.DEFAULT_PASSWORD)
+        parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable datasets")
+
+    def handle(self, *args, **opts):
+        prefix = opts["prefix"]
+        if User.objects.filter(username__in=[f"{prefix}-t0", f"{prefix}-s0"]).exists():
+            raise CommandError(f"Users with prefix '{prefix}' already exist; pick another --prefix.")
+        began = time.monotonic()
+        created = seeding.seed(
+            teachers=opts["teachers"], students=opts["students"], bookings=opts["bookings"],
+            tasks_per_teacher=opts["tasks_per_teacher"], submissions=opts["submissions"],
+            availability_per_teacher=opts["availability_per_teacher"], prefix=prefix,
+            password=opts["password"], batch_size=opts["batch_size"], rng=random.Random(opts["seed"]),
+            log=lambda message: self.stdout.write(f"  {message}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {sum(created.values())} rows in {time.monotonic() - began:.1f}s "
+            f"(log in as {prefix}-t0 / {prefix}-s0)."))
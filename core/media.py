@@ -0,0 +1,96 @@
+"""Process-local cache of signed media URLs.
+
+``S3Boto3Storage.url()`` computes a SigV4 signature on every call, which
+adds up on list pages. Signed URLs are kept per storage name for less than
+their expiry (so a cached URL is always still valid for a while when it is
+handed out), with LRU eviction once the cache is full.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class SignedURLCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # name -> (url, expires_at), oldest first
+        self._lock = threading.Lock()
+
+    def get(self, name, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._entries[name]
+                return None
+            self._entries.move_to_end(name)
+            return entry[0]
+
+    def set(self, name, url, ttl, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[name] = (url, now + ttl)
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+url_cache = SignedURLCache(getattr(settings, "SIGNED_URL_CACHE_SIZE", 4096))
+
+
+def cache_ttl(storage):
+    """Seconds to keep a URL: the setting, or half the storage's signature expiry."""
+    ttl = getattr(settings, "SIGNED_URL_CACHE_TTL", None)
+    if ttl is None:
+        ttl = getattr(storage, "querystring_expire", 3600) // 2
+    return ttl
+
+
+def urls_for(files):
+    """URLs for a batch of ``FieldFile``s, in order (``None`` for empty files).
+
+    Only names missing from the cache are signed.
+    """
+    now = time.monotonic()
+    urls = []
+    for f in files:
+        if not f:
+            urls.append(None)
+            continue
+        url = url_cache.get(f.name, now)
+        if url is None:
+            url = f.storage.url(f.name)
+            url_cache.set(f.name, url, cache_ttl(f.storage), now)
+        urls.append(url)
+    return urls
+
+
+def url_for(file):
+    return urls_for([file])[0]
+
+
+def attach_download_urls(submissions):
+    """Set ``download_url`` on each submission from one ``urls_for`` call."""
+    submissions = [s for s in submissions if s is not None]
+    for sub, url in zip(submissions, urls_for(s.file for s in submissions)):
+        sub.download_url = url
+    return submissions
+
+
+@receiver(setting_changed)
+def _reset_on_storage_change(setting, **kwargs):
+    if setting in ("STORAGES", "MEDIA_URL", "SIGNED_URL_CACHE_TTL"):
+        url_cache.clear()
@@ -0,0 +1,146 @@
+import math
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import db_router, query_metrics
+from .roles import aget_role_names, get_role_names
+
+
+def _already_loaded(user):
+    async def auser():
+        return user
+    return auser
+
+
+class RoleMiddleware:
+    """Resolve the signed-in user's group names once per request.
+
+    Must sit after ``AuthenticationMiddleware``. The names are stored on
+    ``request.user.role_names`` so every ``is_teacher``/``is_student`` call made while
+    handling the request is answered from memory.
+
+    Under ASGI the user is loaded with ``request.auser()`` and ``request.user``
+    is replaced by the loaded instance, so async views can read it without
+    touching the database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        user = getattr(request, "user", None)
+        if user is not None:
+            if user.is_authenticated:
+                get_role_names(user)
+            # async views served over WSGI would otherwise load the user a second time
+            request.auser = _already_loaded(user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if hasattr(request, "auser"):
+            user = await request.auser()
+            request.user = user
+            if user.is_authenticated:
+                await aget_role_names(user)
+        return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Let GET/HEAD requests read from the replicas (``core.db_router``).
+
+    Place it first so session and user lookups are routed too. A request
+    that writes, or arrives with a live pin cookie, reads from the primary;
+    writing also (re)sets the cookie so the user's next requests keep
+    seeing their own changes until the replicas catch up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = db_router.start_request(self.replica_ok(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            state = db_router.end_request(token)
+        return self.remember_write(request, response, state)
+
+    async def __acall__(self, request):
+        token = db_router.start_request(self.replica_ok(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            state = db_router.end_request(token)
+        return self.remember_write(request, response, state)
+
+    def replica_ok(self, request):
+        return request.method in ("GET", "HEAD") and not db_router.pinned_by_cookie(request)
+
+    def remember_write(self, request, response, state):
+        if state.wrote and db_router.replicas():
+            seconds = db_router.pin_seconds()
+            response.set_cookie(db_router.PIN_COOKIE, f"{time.time() + seconds:.3f}",
+                                max_age=math.ceil(seconds), httponly=True, samesite="Lax",
+                                secure=request.is_secure())
+        return response
+
+
+class QueryMetricsMiddleware:
+    """Record query count and DB time for a sample of requests, per URL name.
+
+    ``QUERY_METRICS_SAMPLE_RATE`` (0 to 1) picks the share of requests
+    measured; see ``core.query_metrics``. Place it first so session and
+    user queries are counted too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        queries, token = query_metrics.start()
+        try:
+            return self.get_response(request)
+        finally:
+            query_metrics.finish(self.view_name(request), queries, token)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        queries, token = query_metrics.start()
+        try:
+            return await self.get_response(request)
+        finally:
+            query_metrics.finish(self.view_name(request), queries, token)
+
+    def sampled(self):
+        rate = query_metrics.sample_rate()
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def view_name(self, request):
+        match = getattr(request, "resolver_match", None)
+        return (match.view_name or match._func_path) if match else "<unresolved>"
@@ -0,0 +1,69 @@
+"""Outbox handlers: emails to students (or their parents) and audit records.
+
+Mail goes through Django's ``EMAIL_BACKEND``: the console backend by
+default, a directory of files with ``filebased``, SMTP in production. Each
+handler writes its audit record before sending, keyed on the message, so
+a retry after a failed send doesn't duplicate it.
+"""
+from django.core.mail import send_mail
+
+from bookings.models import LessonBooking
+from homework.models import Submission
+
+from .models import AuditRecord, Profile
+from .outbox import handler
+
+
+def recipient(user):
+    """Where ``user``'s notifications go: a parent for under-16s, when one is on file."""
+    profile = Profile.objects.filter(user=user).first()
+    if profile and profile.under_16 and profile.parent_email:
+        return profile.parent_email
+    return user.email
+
+
+def notify(user, subject, body):
+    to = recipient(user)
+    if to:
+        send_mail(subject, body, None, [to])
+
+
+def audit(message, action, user_id, actor_id=None, **data):
+    AuditRecord.objects.get_or_create(
+        outbox_id=message.pk, defaults={"action": action, "user_id": user_id, "actor_id": actor_id, "data": data})
+
+
+@handler("booking.status_changed")
+def booking_status_changed(payload, message):
+    booking = (LessonBooking.objects.select_related('student', 'teacher', 'subject')
+               .filter(pk=payload["booking"]).first())
+    if booking is None:
+        return  # deleted since; nothing to tell anyone
+    status = payload["status"]
+    audit(message, f"booking.{status}", booking.student_id, payload.get("actor"), booking=booking.pk)
+    when = booking.start_datetime.strftime("%a %d %b %Y, %H:%M %Z")
+    notify(booking.student, f"Lesson {status}: {booking.subject.name}",
+           f"{booking.teacher.username} has {status} the {booking.subject.name} lesson "
+           f"for {booking.student.username} on {when}.")
+
+
+@handler("submission.created")
+def submission_created(payload, message):
+    sub = Submission.objects.select_related('task', 'student').filter(pk=payload["submission"]).first()
+    if sub is None:
+        return
+    audit(message, "submission.created", sub.student_id, sub.student_id, submission=sub.pk, task=sub.task_id)
+    notify(sub.student, f"Submission received: {sub.task.title}",
+           f"We have received {sub.student.username}'s work for \"{sub.task.title}\".")
+
+
+@handler("submission.feedback")
+def submission_feedback(payload, message):
+    sub = Submission.objects.select_related('task', 'student').filter(pk=payload["submission"]).first()
+    if sub is None:
+        return
+    audit(message, "submission.feedback", sub.student_id, payload.get("actor"),
+          submission=sub.pk, locked=sub.locked)
+    if sub.feedback_text:
+        notify(sub.student, f"Feedback on {sub.task.title}",
+               f"{sub.student.username}'s work for \"{sub.task.title}\" has new feedback:\n\n{sub.feedback_text}")
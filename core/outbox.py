@@ -0,0 +1,130 @@
+"""Transactional outbox: side effects that run after the write commits.
+
+A service that changes state calls ``enqueue`` inside its own transaction,
+so the message exists exactly when the change does. ``run_outbox_worker``
+delivers messages in the background:
+
+* ``claim`` picks due messages with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+  so several workers never take the same row. It then leases them by
+  pushing ``available_at`` forward and commits at once. If a worker dies,
+  its messages come back when the lease runs out.
+* ``dispatch`` runs the handlers on a thread pool. A handler that raises is
+  retried with exponential backoff until ``max_attempts``; after that the
+  message is marked ``dead`` and left for inspection.
+
+Delivery is at least once, so handlers must be idempotent (audit records
+are keyed on the message id). Handlers are registered with ``@handler(kind)``
+in ``core.notifications``.
+"""
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+LEASE = timedelta(minutes=5)
+BACKOFF_BASE = 10  # seconds before the first retry; doubles each attempt
+BACKOFF_MAX = 3600
+MAX_ATTEMPTS = 8
+
+
+def handler(kind):
+    """Register ``func(payload, message)`` as the handler for ``kind``."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, **payload):
+    """Queue ``kind`` for delivery once the surrounding transaction commits."""
+    return OutboxMessage.objects.create(kind=kind, payload=payload)
+
+
+def enqueue_many(kind, payloads):
+    return OutboxMessage.objects.bulk_create([OutboxMessage(kind=kind, payload=p) for p in payloads])
+
+
+def backoff(attempts, rng=random):
+    """Seconds to wait after the ``attempts``-th failure: exponential, capped, with jitter."""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * rng.uniform(0.5, 1.0)
+
+
+def claim(batch_size, lease=LEASE):
+    """Lease up to ``batch_size`` due messages to this worker and return them."""
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboxMessage.objects.filter(status='pending', available_at__lte=now).order_by('available_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(id__in=ids).update(available_at=now + lease, attempts=F('attempts') + 1)
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def deliver(message, max_attempts=MAX_ATTEMPTS):
+    """Run one claimed message's handler and record the outcome; returns the new status."""
+    try:
+        func = HANDLERS.get(message.kind)
+        if func is None:
+            raise LookupError(f"No outbox handler for {message.kind!r}")
+        func(message.payload, message)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if message.attempts >= max_attempts:
+            logger.error("Outbox message %s (%s) failed %d times, giving up: %s",
+                         message.pk, message.kind, message.attempts, error)
+            OutboxMessage.objects.filter(pk=message.pk).update(
+                status='dead', last_error=error, processed_at=timezone.now())
+            return 'dead'
+        retry_at = timezone.now() + timedelta(seconds=backoff(message.attempts))
+        logger.warning("Outbox message %s (%s) failed, retrying at %s: %s",
+                       message.pk, message.kind, retry_at.isoformat(), error)
+        OutboxMessage.objects.filter(pk=message.pk).update(available_at=retry_at, last_error=error)
+        return 'pending'
+    OutboxMessage.objects.filter(pk=message.pk).update(status='sent', last_error='', processed_at=timezone.now())
+    return 'sent'
+
+
+def _deliver_pooled(message, max_attempts):
+    # pool threads keep their own connection; drop it if the server closed it
+    close_old_connections()
+    return deliver(message, max_attempts)
+
+
+def dispatch(messages, pool=None, max_attempts=MAX_ATTEMPTS):
+    """Deliver ``messages`` on ``pool`` (or inline without one); returns ``{status: count}``."""
+    counts = {}
+    if pool is None:
+        results = (deliver(m, max_attempts) for m in messages)
+    else:
+        results = pool.map(lambda m: _deliver_pooled(m, max_attempts), messages)
+    for status in results:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def drain(batch_size=100, threads=4, max_attempts=MAX_ATTEMPTS):
+    """Deliver everything due now; ``threads=0`` runs handlers in this thread (tests, cron)."""
+    totals = {}
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="outbox") if threads > 0 else None
+    try:
+        while messages := claim(batch_size):
+            for status, n in dispatch(messages, pool, max_attempts).items():
+                totals[status] = totals.get(status, 0) + n
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return totals
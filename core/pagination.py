@@ -0,0 +1,60 @@
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (ValueError, TypeError, json.JSONDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if value is None:
+        raise InvalidCursor("Invalid cursor")
+    return value, pk
+
+
+def keyset_page(qs, field, cursor=None, page_size=50):
+    """Newest-first page of ``qs`` keyed on ``(field, id)``.
+
+    Returns ``(items, next_cursor)``; ``next_cursor`` is ``None`` on the last
+    page. Fetches one extra row instead of counting, so each page is a single
+    query no matter how deep the client has scrolled.
+    """
+    rows = list(_page_query(qs, field, cursor, page_size))
+    return _split_page(rows, field, page_size)
+
+
+async def akeyset_page(qs, field, cursor=None, page_size=50):
+    """Async ``keyset_page``."""
+    rows = [row async for row in _page_query(qs, field, cursor, page_size)]
+    return _split_page(rows, field, page_size)
+
+
+def _page_query(qs, field, cursor, page_size):
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(**{f"{field}__lt": value}) | Q(**{field: value, "id__lt": pk}))
+    return qs.order_by(f"-{field}", "-id")[:page_size + 1]
+
+
+def _split_page(rows, field, page_size):
+    items = rows[:page_size]
+    next_cursor = None
+    if len(rows) > page_size:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+    return items, next_cursor
@@ -0,0 +1,180 @@
+"""Per-view query counts, DB time and N+1 detection.
+
+Every database connection gets one execute wrapper (installed when the
+connection opens). It does nothing unless ``QueryMetricsMiddleware`` has
+sampled the current request, so the unsampled cost is a context-variable
+lookup per query. Sampled requests add to per-view histograms, exported in
+Prometheus text format by ``render_prometheus``. A request that runs the
+same SQL shape more than ``QUERY_METRICS_N_PLUS_ONE_THRESHOLD`` times is
+logged and counted as a likely N+1.
+
+The histograms cover one process only. Under several gunicorn workers,
+each scrape reports the worker that answered it.
+"""
+import contextvars
+import functools
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import db_router
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_current = contextvars.ContextVar("query_metrics", default=None)
+
+_IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def sample_rate():
+    return getattr(settings, "QUERY_METRICS_SAMPLE_RATE", 0.0)
+
+
+def n_plus_one_threshold():
+    return getattr(settings, "QUERY_METRICS_N_PLUS_ONE_THRESHOLD", 10)
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """``sql`` with parameters and literals collapsed, so repeats of one query compare equal."""
+    return _LITERAL.sub("?", _IN_LIST.sub("IN (...)", sql))
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+
+def _record(execute, sql, params, many, context):
+    queries = _current.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries.seconds += time.perf_counter() - began
+        queries.count += 1
+        queries.shapes[sql] += 1
+
+
+@receiver(connection_created)
+def _install(sender, connection, **kwargs):
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+
+def start():
+    """Collect queries for the current request; pass the result to ``finish``."""
+    queries = RequestQueries()
+    return queries, _current.set(queries)
+
+
+@contextmanager
+def collect():
+    """Count the queries run inside the block, outside the histograms (for benchmarks)."""
+    queries, token = start()
+    try:
+        yield queries
+    finally:
+        _current.reset(token)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}  # label -> [bucket counts..., sum, count]
+
+    def observe(self, label, value):
+        row = self.series.setdefault(label, [0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label, row in sorted(self.series.items()):
+            view = _label(label)
+            for bound, n in zip(self.buckets, row):
+                yield f'{self.name}_bucket{{view="{view}",le="{bound}"}} {n}'
+            yield f'{self.name}_bucket{{view="{view}",le="+Inf"}} {row[-1]}'
+            yield f'{self.name}_sum{{view="{view}"}} {row[-2]:g}'
+            yield f'{self.name}_count{{view="{view}"}} {row[-1]}'
+
+
+QUERIES = Histogram("django_view_queries", "SQL queries per sampled request.", QUERY_BUCKETS)
+DB_SECONDS = Histogram("django_view_db_seconds", "Time spent in SQL per sampled request.", SECONDS_BUCKETS)
+N_PLUS_ONE = Counter()  # view -> requests flagged
+_lock = threading.Lock()
+
+
+def finish(view, queries, token):
+    """Stop collecting and fold the request into the histograms."""
+    _current.reset(token)
+    threshold = n_plus_one_threshold()
+    shapes = Counter()
+    for sql, n in queries.shapes.items():
+        shapes[fingerprint(sql)] += n
+    repeated = [(shape, n) for shape, n in shapes.items() if n > threshold]
+    with _lock:
+        QUERIES.observe(view, queries.count)
+        DB_SECONDS.observe(view, queries.seconds)
+        if repeated:
+            N_PLUS_ONE[view] += 1
+    for shape, n in repeated:
+        logger.warning("Likely N+1 in %s: %d runs of %s", view, n, shape)
+    return repeated
+
+
+def reset():
+    with _lock:
+        QUERIES.series.clear()
+        DB_SECONDS.series.clear()
+        N_PLUS_ONE.clear()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus():
+    """All query and database-routing metrics in Prometheus text format."""
+    with _lock:
+        lines = list(QUERIES.lines()) + list(DB_SECONDS.lines())
+        lines += ["# HELP django_view_n_plus_one_total Sampled requests that repeated one query shape.",
+                  "# TYPE django_view_n_plus_one_total counter"]
+        lines += [f'django_view_n_plus_one_total{{view="{_label(v)}"}} {n}' for v, n in sorted(N_PLUS_ONE.items())]
+
+    db = db_router.db_metrics()
+    for kind, help in (("reads", "Reads routed to each database alias."),
+                       ("writes", "Writes routed to each database alias."),
+                       ("connects", "Database connections opened.")):
+        name = f"django_db_{kind}_total"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+        lines += [f'{name}{{alias="{_label(a)}"}} {n}' for a, n in sorted(db[kind].items())]
+    lines += ["# HELP django_db_replica_pins_total Requests moved off the replicas, by reason.",
+              "# TYPE django_db_replica_pins_total counter"]
+    lines += [f'django_db_replica_pins_total{{reason="{_label(r)}"}} {n}' for r, n in sorted(db["pins"].items())]
+    lines += ["# HELP django_db_pool Connection pool statistics.", "# TYPE django_db_pool gauge"]
+    for alias, stats in sorted(db["pools"].items()):
+        lines += [f'django_db_pool{{alias="{_label(alias)}",stat="{_label(k)}"}} {v}'
+                  for k, v in sorted(stats.items())]
+    return "\n".join(lines) + "\n"
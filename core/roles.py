@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import Signal, receiver
+
+User = get_user_model()
+
+ROLE_CACHE_TIMEOUT = getattr(settings, "ROLE_CACHE_TIMEOUT", 300)
+
+
+def enabled():
+    # invalidation only reaches other workers through a shared cache; with the
+    # per-process local-memory cache they would keep serving old roles
+    return getattr(settings, "ROLE_CACHE_ENABLED", False)
+
+# sent with ``user_ids`` whenever group membership changes
+roles_changed = Signal()
+
+
+def role_key(user_id):
+    return f"roles:user:{user_id}"
+
+
+def get_role_names(user):
+    """Group names for ``user``, memoised on the instance and (if enabled) in the cache."""
+    if not getattr(user, "is_authenticated", False) or user.pk is None:
+        return frozenset()
+    names = getattr(user, "role_names", None)
+    if names is not None:
+        return names
+    if not enabled():
+        names = frozenset(user.groups.values_list("name", flat=True))
+        user.role_names = names
+        return names
+    key = role_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        cached = list(user.groups.values_list("name", flat=True))
+        cache.set(key, cached, ROLE_CACHE_TIMEOUT)
+    names = frozenset(cached)
+    user.role_names = names
+    return names
+
+
+async def aget_role_names(user):
+    """Async ``get_role_names``, for async views and middleware."""
+    if not getattr(user, "is_authenticated", False) or user.pk is None:
+        return frozenset()
+    names = getattr(user, "role_names", None)
+    if names is not None:
+        return names
+    if not enabled():
+        names = frozenset([name async for name in user.groups.values_list("name", flat=True)])
+        user.role_names = names
+        return names
+    key = role_key(user.pk)
+    cached = await cache.aget(key)
+    if cached is None:
+        cached = [name async for name in user.groups.values_list("name", flat=True)]
+        await cache.aset(key, cached, ROLE_CACHE_TIMEOUT)
+    names = frozenset(cached)
+    user.role_names = names
+    return names
+
+
+def role_names_for(user_ids):
+    """``{user_id: frozenset of group names}`` for the users that exist, in at most one query."""
+    user_ids = set(user_ids)
+    found = {}
+    if enabled():
+        cached = cache.get_many([role_key(uid) for uid in user_ids])
+        found = {uid: frozenset(cached[role_key(uid)]) for uid in user_ids if role_key(uid) in cached}
+    missing = user_ids - found.keys()
+    if missing:
+        loaded = {}
+        for uid, name in User.objects.filter(pk__in=missing).values_list("pk", "groups__name"):
+            names = loaded.setdefault(uid, [])
+            if name:
+                names.append(name)
+        if enabled():
+            cache.set_many({role_key(uid): names for uid, names in loaded.items()}, ROLE_CACHE_TIMEOUT)
+        found.update((uid, frozenset(names)) for uid, names in loaded.items())
+    return found
+
+
+def has_role(user, name):
+    return name in get_role_names(user)
+
+
+def is_teacher(user):
+    return has_role(user, "teacher")
+
+
+def is_student(user):
+    return has_role(user, "student")
+
+
+def invalidate_roles(*user_ids):
+    cache.delete_many([role_key(uid) for uid in user_ids])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear", "pre_clear"):
+        return
+    if reverse:
+        # group.user_set.add(...): pk_set holds user ids (empty on clear)
+        user_ids = pk_set or list(instance.user_set.values_list("pk", flat=True))
+    else:
+        user_ids = [instance.pk]
+        instance.__dict__.pop("role_names", None)
+    if user_ids:
+        invalidate_roles(*user_ids)
+        roles_changed.send(sender=User, user_ids=list(user_ids))
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    # role_names_for treats a cached entry as proof the user exists
+    invalidate_roles(instance.pk)
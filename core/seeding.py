@@ -0,0 +1,176 @@
+"""Synthetic data at production-like volumes, for load tests and benchmarks.
+
+Rows go in with ``bulk_create`` in batches and are generated lazily, so
+millions of bookings never sit in memory at once. Model signals don't fire,
+which is fine for the version caches (every row belongs to a new user) but
+means the catalog version is bumped by hand when subjects are added.
+"""
+import random
+from datetime import time, timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.utils import timezone
+
+from bookings.intervals import ACTIVE_STATUSES
+from bookings.models import AvailabilitySlot, LessonBooking, TeacherAvailability
+from bookings.slots import materialize
+from homework.models import Submission, Task
+from subjects.models import Subject, TeacherSubject, UserSubject
+from subjects.management.commands.seed_subjects import SUBJECTS
+
+from . import versions
+
+User = get_user_model()
+
+DEFAULT_PASSWORD = "load-test-password"
+
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def seed(teachers=20, students=200, bookings=2000, tasks_per_teacher=10, submissions=5000,
+         availability_per_teacher=5, prefix="load", password=DEFAULT_PASSWORD, batch_size=5000,
+         rng=None, log=lambda message: None):
+    """Create the given volumes of users and rows; returns ``{model label: rows created}``.
+
+    Usernames are ``<prefix>-t<n>`` / ``<prefix>-s<n>``, all with ``password``.
+    """
+    rng = rng or random.Random(0)
+    created = {}
+
+    def insert(model, rows):
+        n = 0
+        for batch in batched(rows, batch_size):
+            model.objects.bulk_create(batch)
+            n += len(batch)
+        created[model._meta.label] = n
+        log(f"{model._meta.label}: {n}")
+
+    existing = set(Subject.objects.values_list("code", flat=True))
+    new_subjects = [Subject(code=code, name=name) for code, name in SUBJECTS if code not in existing]
+    if new_subjects:
+        Subject.objects.bulk_create(new_subjects)
+        versions.bump(versions.version_key(versions.CATALOG))
+    subject_ids = list(Subject.objects.filter(code__in=[c for c, _ in SUBJECTS]).values_list("id", flat=True))
+    created[Subject._meta.label] = len(new_subjects)
+
+    hashed = make_password(password)  # hashing 100k passwords one by one would dominate the run
+    teacher_ids = _create_users(f"{prefix}-t", teachers, hashed, "teacher", batch_size, created, log)
+    student_ids = _create_users(f"{prefix}-s", students, hashed, "student", batch_size, created, log)
+
+    teaches = {t: rng.sample(subject_ids, rng.randint(1, 3)) for t in teacher_ids}
+    teachers_of, students_of = {}, {}
+    for t, subs in teaches.items():
+        for sid in subs:
+            teachers_of.setdefault(sid, []).append(t)
+    # students pick taught subjects, so every booking can find a teacher
+    taught = sorted(teachers_of) or subject_ids
+    studies = {s: rng.sample(taught, rng.randint(1, min(3, len(taught)))) for s in student_ids}
+    for s, subs in studies.items():
+        for sid in subs:
+            students_of.setdefault(sid, []).append(s)
+    insert(TeacherSubject, (TeacherSubject(teacher_id=t, subject_id=sid)
+                            for t, subs in teaches.items() for sid in subs))
+    insert(UserSubject, (UserSubject(user_id=s, subject_id=sid) for s, subs in studies.items() for sid in subs))
+
+    insert(TeacherAvailability, _availability(teaches, availability_per_teacher, rng))
+    if teacher_ids and student_ids:
+        insert(LessonBooking, _bookings(bookings, student_ids, studies, teachers_of, rng))
+    task_ids = _create_tasks(teaches, tasks_per_teacher, batch_size, rng, created, log)
+    pairs = [(task_id, sid, teacher_id) for task_id, sid, teacher_id in task_ids if students_of.get(sid)]
+    if pairs:
+        insert(Submission, _submissions(submissions, pairs, students_of, rng))
+
+    # bulk_create skips the receivers that keep slots current, so build them once at the end
+    created[AvailabilitySlot._meta.label] = materialize(batch_size=batch_size)
+    log(f"{AvailabilitySlot._meta.label}: {created[AvailabilitySlot._meta.label]}")
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+    return created
+
+
+def _create_users(prefix, n, hashed, group_name, batch_size, created, log):
+    group, _ = Group.objects.get_or_create(name=group_name)
+    Membership = User.groups.through
+    ids = []
+    for batch in batched(range(n), batch_size):
+        users = User.objects.bulk_create(
+            [User(username=f"{prefix}{i}", password=hashed, email=f"{prefix}{i}@example.com") for i in batch])
+        batch_ids = [u.pk for u in users]
+        Membership.objects.bulk_create([Membership(user_id=pk, group_id=group.id) for pk in batch_ids])
+        ids += batch_ids
+    created[f"{group_name}s"] = n
+    log(f"{group_name}s: {n}")
+    return ids
+
+
+def _availability(teaches, per_teacher, rng):
+    for teacher_id, subject_ids in teaches.items():
+        for _ in range(per_teacher):
+            start = rng.randint(8, 18)
+            yield TeacherAvailability(teacher_id=teacher_id, subject_id=rng.choice(subject_ids),
+                                      weekday=rng.randint(0, 6), start_time=time(start),
+                                      end_time=time(min(start + rng.randint(1, 4), 23)))
+
+
+def _bookings(n, student_ids, studies, teachers_of, rng):
+    """Random bookings; a teacher's pending/approved ones never overlap.
+
+    That is what the PostgreSQL exclusion constraint enforces, so an active
+    booking that lands on a busy hour walks forward through the teacher's
+    calendar an hour at a time until the whole lesson fits.
+    """
+    now = timezone.now().replace(minute=0, second=0, microsecond=0)
+    busy = {}  # teacher id -> hour offsets from now taken by active bookings
+    for _ in range(n):
+        student_id = rng.choice(student_ids)
+        subject_id = rng.choice(studies[student_id])
+        teacher_id = rng.choice(teachers_of[subject_id])
+        hour = rng.randint(-180 * 24, 60 * 24)
+        length = rng.choice((1, 1, 2))
+        status = rng.choice(("completed", "completed", "cancelled") if hour < 0
+                            else ("pending", "approved", "approved", "rejected"))
+        if status in ACTIVE_STATUSES:
+            taken = busy.setdefault(teacher_id, set())
+            while not taken.isdisjoint(range(hour, hour + length)):
+                hour += 1
+            taken.update(range(hour, hour + length))
+        start = now + timedelta(hours=hour)
+        yield LessonBooking(student_id=student_id, teacher_id=teacher_id, subject_id=subject_id,
+                            start_datetime=start, end_datetime=start + timedelta(hours=length), status=status)
+
+
+def _create_tasks(teaches, per_teacher, batch_size, rng, created, log):
+    now = timezone.now()
+    rows = []
+    for teacher_id, subject_ids in teaches.items():
+        for i in range(per_teacher):
+            release = now - timedelta(days=rng.randint(0, 120))
+            rows.append(Task(teacher_id=teacher_id, subject_id=rng.choice(subject_ids), title=f"Worksheet {i + 1}",
+                             description="Generated by seed_load.", release_dt=release,
+                             due_dt=release + timedelta(days=14)))
+    ids = []
+    for batch in batched(rows, batch_size):
+        ids += [(t.pk, t.subject_id, t.teacher_id) for t in Task.objects.bulk_create(batch)]
+    created[Task._meta.label] = len(ids)
+    log(f"{Task._meta.label}: {len(ids)}")
+    return ids
+
+
+def _submissions(n, pairs, students_of, rng):
+    for i in range(n):
+        task_id, subject_id, teacher_id = rng.choice(pairs)
+        student_id = rng.choice(students_of[subject_id])
+        reviewed = rng.random() < 0.5
+        yield Submission(task_id=task_id, student_id=student_id, teacher_id=teacher_id,
+                         file=f"submissions/{task_id}/{student_id}/load-{i}.pdf", feedback_text="Good work." if reviewed else "", locked=reviewed and rng.random() < 0.5,
+                         feedback_at=timezone.now() if reviewed else None)
@@ -0,0 +1,159 @@
+"""Query-budget test support, shared by core/tests.py and api/tests.py.
+
+Every URL gets a fixed number of queries, checked against a small and a
+large fixture (``SIZES`` rows of bookings, tasks and submissions per user).
+A view whose query count depends on the data (an N+1) fails at the large
+size even if its budget was set at the small one.
+"""
+import tempfile
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from bookings.models import LessonBooking, TeacherAvailability
+from bookings.slots import materialize
+from homework.models import Submission, Task
+from subjects.catalog import clear_local
+from subjects.models import Subject, TeacherSubject, UserSubject
+
+from .media import url_cache
+
+User = get_user_model()
+
+SIZES = (10, 1000)
+PENDING = 20
+
+LOCAL_STORAGE = dict(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": tempfile.mkdtemp(prefix="budget-media-")}},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+    SUBMISSION_UPLOAD_BACKEND="homework.uploads.LocalPresignedUploads",
+    VERSIONED_CACHE_ENABLED=False,
+    QUERY_METRICS_SAMPLE_RATE=0,
+)
+
+
+class Budget(NamedTuple):
+    """One request and the number of queries it may run."""
+    name: str
+    role: Optional[str]  # "teacher", "student", "staff" or None (anonymous)
+    queries: int
+    method: str = "get"
+    kwargs: Callable = lambda pair: {}
+    data: Callable = lambda pair: None
+    status: int = 200
+    multipart: bool = False  # API writes are sent as JSON unless this is set
+
+
+def url_names(patterns):
+    for p in patterns:
+        if isinstance(p, URLResolver):
+            yield from url_names(p.url_patterns)
+        elif isinstance(p, URLPattern) and p.name:
+            yield p.name
+
+
+def seed_pair(label, rows):
+    """A teacher, a student and a staff user; the first two share two subjects and ``rows``
+    past bookings, tasks and submissions, plus ``PENDING`` open booking requests."""
+    teacher = User.objects.create_user(f"{label}-teacher")
+    teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+    student = User.objects.create_user(f"{label}-student")
+    student.groups.add(Group.objects.get_or_create(name="student")[0])
+    staff = User.objects.create_user(f"{label}-staff", is_staff=True)
+    subjects = Subject.objects.bulk_create(
+        [Subject(code=f"{label}-{i}", name=f"{label} subject {i}") for i in range(2)])
+    TeacherSubject.objects.bulk_create([TeacherSubject(teacher=teacher, subject=s) for s in subjects])
+    UserSubject.objects.bulk_create([UserSubject(user=student, subject=s) for s in subjects])
+    availability = TeacherAvailability.objects.bulk_create(
+        [TeacherAvailability(teacher=teacher, subject=subjects[0], weekday=day,
+                             start_time=time(8), end_time=time(20)) for day in range(7)])
+
+    now = timezone.now()
+    statuses = ["pending", "approved", "rejected", "completed"]
+    LessonBooking.objects.bulk_create([
+        LessonBooking(student=student, teacher=teacher, subject=subjects[i % 2],
+                      start_datetime=now - timedelta(days=1, hours=2 * i),
+                      end_datetime=now - timedelta(days=1, hours=2 * i - 1),
+                      status=statuses[i % len(statuses)])
+        for i in range(rows)])
+    # open requests for the approve/reject endpoints, the same number at every size
+    pending = LessonBooking.objects.bulk_create([
+        LessonBooking(student=student, teacher=teacher, subject=subjects[0],
+                      start_datetime=now + timedelta(days=2, hours=2 * i),
+                      end_datetime=now + timedelta(days=2, hours=2 * i + 1))
+        for i in range(PENDING)])
+    tasks = Task.objects.bulk_create([
+        Task(teacher=teacher, subject=subjects[i % 2], title=f"Task {i}", release_dt=now - timedelta(days=1))
+        for i in range(rows)])
+    submissions = Submission.objects.bulk_create([
+        Submission(task=task, student=student, teacher=teacher, file=f"submissions/{label}/{i}.pdf",
+                   feedback_text="Well done" if i % 2 else "")
+        for i, task in enumerate(tasks)])
+
+    materialize([teacher.id])
+
+    # free lesson slots a month out, clear of the seeded bookings
+    day = timezone.localdate() + timedelta(days=30)
+    free_starts = [timezone.make_aware(datetime.combine(day, time(hour))).isoformat() for hour in (10, 12, 14)]
+    return SimpleNamespace(
+        teacher=teacher, student=student, staff=staff, subjects=subjects, tasks=tasks, submissions=submissions,
+        pending=[b.id for b in pending], availability=availability[day.weekday()], free_starts=free_starts)
+
+
+@override_settings(**LOCAL_STORAGE)
+class QueryBudgetTestCase(TestCase):
+    """Checks each of ``budgets`` at every size in ``SIZES``.
+
+    Caches are cleared before each measured request, so budgets are for a
+    cold cache and don't depend on test order.
+    """
+
+    budgets = ()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.pairs = {rows: seed_pair(f"q{rows}", rows) for rows in SIZES}
+
+    def measure(self, budget, pair):
+        user = getattr(pair, budget.role) if budget.role else None
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        cache.clear()
+        clear_local()
+        url_cache.clear()
+        path = reverse(budget.name, kwargs=budget.kwargs(pair))
+        data = budget.data(pair)
+        json_body = budget.method != "get" and budget.name.startswith("api_") and not budget.multipart
+        extra = {"content_type": "application/json"} if json_body else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, budget.method)(path, data, **extra)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, budget.status,
+                         f"{budget.name} as {budget.role}: {getattr(response, 'content', b'')[:200]!r}")
+        return len(queries), queries
+
+    def test_query_budgets(self):
+        for budget in self.budgets:
+            with self.subTest(budget.name, role=budget.role, method=budget.method):
+                runs = {rows: self.measure(budget, pair) for rows, pair in self.pairs.items()}
+                counts = {rows: n for rows, (n, _) in runs.items()}
+                if set(counts.values()) != {budget.queries}:
+                    worst = max(runs, key=lambda rows: counts[rows])
+                    sql = "\n".join(q["sql"] for q in runs[worst][1].captured_queries)
+                    self.fail(f"{budget.name} ({budget.role}) ran {counts} queries by rows per user, "
+                              f"budget {budget.queries}. At {worst} rows:\n{sql}")
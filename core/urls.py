@@ -16,6 +16,8 @@ urlpatterns = [
     path('teacher/submissions/', views.teacher_submissions, name='teacher_submissions'),
     path('teacher/submissions/<int:submission_id>/', views.teacher_submission_detail, name='teacher_submission_detail'),
     path('teacher/tasks/<int:task_id>/submissions/', views.teacher_task_submissions, name='teacher_task_submissions'),
+    path('teacher/tasks/<int:task_id>/submissions/download/', views.teacher_task_submissions_zip, name='teacher_task_submissions_zip'),
+    path('internal/metrics', views.internal_metrics, name='internal_metrics'),
 
 
 
@@ -0,0 +1,189 @@
+from functools import cached_property
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+
+from .roles import role_names_for
+
+User = get_user_model()
+
+USER = User._meta.label_lower
+SUBJECT = "subjects.subject"
+TASK = "homework.task"
+
+
+class ValidationContext:
+    """Preloaded lookups for validating a batch of model instances.
+
+    Built from the objects about to be validated; it resolves every user
+    (with their roles, through ``core.roles``), subject and task they point
+    at, plus the teacher-subject and student-subject pairs, in at most five
+    queries no matter how many objects there are. Related instances already
+    loaded on the objects (and users whose roles are already memoised) are
+    reused without a query.
+    """
+
+    def __init__(self, objs):
+        self.objs = list(objs)
+        self.existing = {USER: set(), SUBJECT: set(), TASK: set()}
+        self.roles = {}
+        self.task_subjects = {}
+        wanted = {USER: set(), SUBJECT: set(), TASK: set()}
+
+        for obj in self.objs:
+            for field in self._preloaded_fks(obj):
+                label = field.related_model._meta.label_lower
+                try:
+                    # form input arrives as strings; clean_fields() would coerce, but it skips checked FKs
+                    pk = field.target_field.to_python(getattr(obj, field.attname))
+                except ValidationError:
+                    continue  # can't exist; reported by missing_fk_errors
+                setattr(obj, field.attname, pk)
+                cached = field.get_cached_value(obj, None) if field.is_cached(obj) else None
+                if cached is not None and not cached._state.adding and cached.pk == pk:
+                    if label == USER and getattr(cached, "role_names", None) is None:
+                        wanted[USER].add(pk)
+                        continue
+                    self._remember(label, cached)
+                else:
+                    wanted[label].add(pk)
+
+        if wanted[TASK]:
+            Task = apps.get_model("homework", "Task")
+            for pk, subject_id in Task.objects.filter(pk__in=wanted[TASK]).values_list("pk", "subject_id"):
+                self.existing[TASK].add(pk)
+                self.task_subjects[pk] = subject_id
+        if wanted[USER]:
+            for pk, names in role_names_for(wanted[USER]).items():
+                self.existing[USER].add(pk)
+                self.roles[pk] = set(names)
+        subject_ids = wanted[SUBJECT] - self.existing[SUBJECT]
+        if subject_ids:
+            Subject = apps.get_model("subjects", "Subject")
+            self.existing[SUBJECT].update(Subject.objects.filter(pk__in=subject_ids).values_list("pk", flat=True))
+
+    @staticmethod
+    def _preloaded_fks(obj):
+        # editable=False FKs are copied by the model from rows checked here (e.g.
+        # Submission.teacher from its task); they aren't input to validate
+        for field in obj._meta.concrete_fields:
+            if (field.is_relation and field.editable and getattr(obj, field.attname) is not None
+                    and field.related_model._meta.label_lower in (USER, SUBJECT, TASK)):
+                yield field
+
+    def _remember(self, label, instance):
+        self.existing[label].add(instance.pk)
+        if label == USER:
+            self.roles[instance.pk] = set(instance.role_names)
+        elif label == TASK:
+            self.task_subjects[instance.pk] = instance.subject_id
+
+    @cached_property
+    def _subject_ids(self):
+        return self.existing[SUBJECT] | set(self.task_subjects.values())
+
+    @cached_property
+    def _teacher_subjects(self):
+        TeacherSubject = apps.get_model("subjects", "TeacherSubject")
+        return set(TeacherSubject.objects
+                   .filter(teacher_id__in=self.existing[USER], subject_id__in=self._subject_ids)
+                   .values_list("teacher_id", "subject_id"))
+
+    @cached_property
+    def _student_subjects(self):
+        UserSubject = apps.get_model("subjects", "UserSubject")
+        return set(UserSubject.objects
+                   .filter(user_id__in=self.existing[USER], subject_id__in=self._subject_ids)
+                   .values_list("user_id", "subject_id"))
+
+    def is_teacher(self, user_id):
+        return "teacher" in self.roles.get(user_id, ())
+
+    def teaches(self, teacher_id, subject_id):
+        return (teacher_id, subject_id) in self._teacher_subjects
+
+    def studies(self, user_id, subject_id):
+        return (user_id, subject_id) in self._student_subjects
+
+    def task_subject_id(self, task_id):
+        return self.task_subjects.get(task_id)
+
+    def checked_fields(self, obj):
+        """FK fields whose existence this context has already established."""
+        return {field.name for field in self._preloaded_fks(obj)}
+
+    @staticmethod
+    def derived_fields(obj):
+        return {field.name for field in obj._meta.concrete_fields if field.is_relation and not field.editable}
+
+    def missing_fk_errors(self, obj):
+        errors = {}
+        for field in self._preloaded_fks(obj):
+            if getattr(obj, field.attname) not in self.existing[field.related_model._meta.label_lower]:
+                errors[field.name] = [f"{field.related_model._meta.verbose_name.capitalize()} does not exist."]
+        return errors
+
+
+class BatchValidatedModel:
+    """Mixin for models that run ``full_clean()`` on every ``save()``.
+
+    Validation goes through a ``ValidationContext`` so the group, subject and
+    FK-existence lookups are shared; ``clean()`` implementations should read
+    them from ``self.validation_context()``.
+    """
+
+    def validation_context(self):
+        ctx = getattr(self, "_validation_context", None)
+        return ctx if ctx is not None else ValidationContext([self])
+
+    def full_clean(self, exclude=None, validate_unique=True, validate_constraints=True):
+        ctx = getattr(self, "_validation_context", None)
+        if ctx is None:
+            return super().full_clean(exclude, validate_unique, validate_constraints)
+        errors = ctx.missing_fk_errors(self)
+        exclude = set(exclude or ()) | ctx.checked_fields(self) | ctx.derived_fields(self)
+        try:
+            super().full_clean(exclude, validate_unique, validate_constraints)
+        except ValidationError as e:
+            errors = e.update_error_dict(errors)
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        full_clean_all([self])
+        return super().save(*args, **kwargs)
+
+
+def full_clean_all(objs):
+    """Validate ``objs`` against one shared context.
+
+    A single object re-raises its own ``ValidationError``; for a batch the
+    error maps each failing object's index to its messages.
+    """
+    objs = list(objs)
+    ctx = ValidationContext(objs)
+    errors = {}
+    for i, obj in enumerate(objs):
+        obj._validation_context = ctx
+        try:
+            obj.full_clean()
+        except ValidationError as e:
+            errors[i] = e
+        finally:
+            del obj._validation_context
+    if len(objs) == 1 and errors:
+        raise errors[0]
+    if errors:
+        raise ValidationError({str(i): e.messages for i, e in errors.items()})
+
+
+def bulk_create_validated(model, objs, **kwargs):
+    """Opt-in path for trusted bulk writes: validate the batch, then insert it.
+
+    ``bulk_create`` skips ``save()``, so this is the way to keep model rules
+    enforced on bulk paths without paying per-row validation queries.
+    """
+    objs = list(objs)
+    full_clean_all(objs)
+    return model.objects.bulk_create(objs, **kwargs)
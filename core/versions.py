@@ -0,0 +1,186 @@
+"""Per-user version counters for cached pages.
+
+A version is a token (issue time plus a random suffix) stored in the cache
+under ``ver:<scope>:<id>``;
+writes that change what a user sees replace it with a fresh one (through the
+model signals below, or ``bump()`` on bulk paths that skip signals). Cached
+bodies are stored together with the versions they were built from and are
+only served while those still match, so one ``get_many`` round trip both
+checks freshness and returns the page.
+
+Versions are bumped twice: immediately, so the writing request never reads
+its own stale page, and again on commit, so a page built by a concurrent
+request from pre-commit data can't outlive the write.
+
+A request that sees a version younger than ``REPLICA_PIN_SECONDS`` reads
+from the primary, so a lagging replica can't be cached under it
+(``core.db_router``).
+"""
+import secrets
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from bookings.models import LessonBooking
+from homework.models import Submission, Task
+from subjects.models import Subject, UserSubject
+
+from . import db_router
+from .roles import roles_changed
+
+User = get_user_model()
+
+USER = "user"
+CATALOG = "catalog"  # subject names/codes, shared by everyone
+
+PAGE_CACHE_TIMEOUT = getattr(settings, "PAGE_CACHE_TIMEOUT", 3600)
+CSRF_PLACEHOLDER = "__csrf_token_placeholder__"
+
+
+def enabled():
+    # the local-memory cache is per process, so a bump in one worker would
+    # leave the others serving stale pages
+    return getattr(settings, "VERSIONED_CACHE_ENABLED", False)
+
+
+def version_key(scope, ident=""):
+    return f"ver:{scope}:{ident}"
+
+
+def user_key(user_id):
+    return version_key(USER, user_id)
+
+
+def _new_version():
+    # hex microseconds first, so the token also says when it was set (Last-Modified)
+    return f"{time.time_ns() // 1000:x}-{secrets.token_hex(4)}"
+
+
+def version_time(token):
+    """When ``token`` was issued, as an aware UTC datetime."""
+    return datetime.fromtimestamp(int(token.split("-", 1)[0], 16) / 1e6, dt_timezone.utc)
+
+
+def _pin_if_recent(tokens):
+    if not db_router.reading_from_replica():
+        return
+    horizon = (time.time() - db_router.pin_seconds()) * 1e6
+    if any(int(t.split("-", 1)[0], 16) > horizon for t in tokens):
+        db_router.pin_to_primary("recent-version")
+
+
+def bump(*keys):
+    """Invalidate everything built from ``keys`` (now and again on commit)."""
+    keys = [k for k in keys if k]
+    if not keys or not enabled():
+        return
+
+    def replace():
+        cache.set_many({k: _new_version() for k in keys}, None)
+
+    replace()
+    transaction.on_commit(replace)
+
+
+def bump_users(*user_ids):
+    bump(*(user_key(uid) for uid in set(user_ids) if uid))
+
+
+def current_versions(keys, extra=()):
+    """``(versions, extra_values)`` for ``keys`` plus any ``extra`` cache keys, in one read.
+
+    Missing versions (never set, or evicted) are created, which can only
+    cause a miss, never a stale hit.
+    """
+    found = cache.get_many(list(keys) + list(extra))
+    missing = {k: _new_version() for k in keys if k not in found}
+    if missing:
+        for k, v in missing.items():
+            # another worker may create the same version concurrently; keep theirs
+            if not cache.add(k, v, None):
+                missing[k] = cache.get(k, v)
+        found.update(missing)
+    tokens = tuple(found[k] for k in keys)
+    _pin_if_recent(tokens)
+    return tokens, {k: found[k] for k in extra if k in found}
+
+
+async def acurrent_versions(keys):
+    """Async ``current_versions`` for ``keys`` alone."""
+    found = await cache.aget_many(list(keys))
+    for k in keys:
+        if k not in found:
+            v = _new_version()
+            found[k] = v if await cache.aadd(k, v, None) else await cache.aget(k, v)
+    tokens = tuple(found[k] for k in keys)
+    _pin_if_recent(tokens)
+    return tokens
+
+
+def render_versioned(request, name, keys, template_name, get_context):
+    """Render ``template_name`` or serve it from cache while ``keys`` are unchanged.
+
+    ``name`` identifies the page (include the user id for per-user pages).
+    ``get_context`` is only called on a miss. ``{% csrf_token %}`` is cached
+    as a placeholder and filled in per request.
+    """
+    if not enabled():
+        return HttpResponse(render_to_string(template_name, get_context(), request))
+    body_key = f"page:{name}"
+    versions, stored = current_versions(keys, extra=[body_key])
+    entry = stored.get(body_key)
+    if entry is not None and entry[0] == versions:
+        html = entry[1]
+    else:
+        context = dict(get_context(), csrf_token=CSRF_PLACEHOLDER)
+        html = render_to_string(template_name, context, request)
+        cache.set(body_key, (versions, html), PAGE_CACHE_TIMEOUT)
+    if CSRF_PLACEHOLDER in html:
+        html = html.replace(CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(html)
+
+
+@receiver([post_save, post_delete], sender=LessonBooking)
+def _booking_changed(sender, instance, **kwargs):
+    bump_users(instance.student_id, instance.teacher_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return  # every login saves this; nothing cached shows it
+    bump_users(instance.pk)
+
+
+@receiver(roles_changed)
+def _roles_changed(sender, user_ids, **kwargs):
+    bump_users(*user_ids)
+
+
+@receiver([post_save, post_delete], sender=UserSubject)
+def _user_subject_changed(sender, instance, **kwargs):
+    bump_users(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Task)
+def _task_changed(sender, instance, **kwargs):
+    bump_users(instance.teacher_id)
+
+
+@receiver([post_save, post_delete], sender=Submission)
+def _submission_changed(sender, instance, **kwargs):
+    bump_users(instance.student_id, instance.teacher_id)
+
+
+@receiver([post_save, post_delete], sender=Subject)
+def _subject_changed(sender, instance, **kwargs):
+    bump(version_key(CATALOG))
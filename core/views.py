@@ -1,21 +1,39 @@
+import hmac
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Subquery
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from subjects.models import Subject, UserSubject, TeacherSubject
 from django.views.decorators.http import require_GET
 from bookings.models import LessonBooking
-from django.http import HttpResponseForbidden, Http404
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, Http404, StreamingHttpResponse
 from django.contrib.auth.models import Group
+from django.core.handlers.asgi import ASGIRequest
 from .forms import SignupForm
 from .models import Profile
 from homework.models import Task, Submission
 from django.utils import timezone
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from subjects.catalog import get_catalog
+from subjects.services import set_student_subjects, set_teacher_subjects
+from homework.services import (SubmissionError, check_can_submit, create_submission, latest_submission,
+                               save_feedback)
+from homework.export import astream_zip, latest_submissions, stream_zip
+from homework.uploads import allowed_content_types
+from .media import attach_download_urls
+from .query_metrics import render_prometheus
+from .pagination import InvalidCursor, keyset_page
+from .roles import is_student, is_teacher
+from .versions import CATALOG, render_versioned, user_key, version_key
+
+TASKS_PER_PAGE = 20
+SUBMISSIONS_PER_PAGE = 25
 
-def is_student(user):
-    return user.groups.filter(name="student").exists()
-    
 def ensure_group(name):
     Group.objects.get_or_create(name=name)
 
@@ -84,15 +102,18 @@ def dashboard(request):
     if is_teacher(request.user) or request.user.is_staff:
         return redirect('teacher_dashboard')
 
-    my_subjects = Subject.objects.filter(usersubject__user=request.user)
-    my_bookings = LessonBooking.objects.filter(student=request.user)\
-        .select_related('teacher','subject').order_by('-created_at')[:20]
+    def context():
+        my_subjects = Subject.objects.filter(usersubject__user=request.user)
+        my_bookings = LessonBooking.objects.filter(student=request.user)\
+            .select_related('teacher','subject').order_by('-created_at')[:20]
+        return {
+            'my_subjects': my_subjects,
+            'my_bookings': my_bookings,
+            'is_teacher': False,  # hard-false since teachers are redirected
+        }
 
-    return render(request, 'core/dashboard.html', {
-        'my_subjects': my_subjects,
-        'my_bookings': my_bookings,
-        'is_teacher': False,  # hard-false since teachers are redirected
-    })
+    keys = [user_key(request.user.id), version_key(CATALOG)]
+    return render_versioned(request, f'dashboard:{request.user.id}', keys, 'core/dashboard.html', context)
 
 
 @login_required
@@ -100,30 +121,32 @@ def teacher_dashboard(request):
     if not (is_teacher(request.user) or request.user.is_staff):
         return HttpResponseForbidden("Not allowed")
 
-    pending = LessonBooking.objects.filter(
-        teacher=request.user, status='pending'
-    ).select_related('student','subject').order_by('start_datetime')
+    def context():
+        pending = LessonBooking.objects.filter(
+            teacher=request.user, status='pending'
+        ).select_related('student','subject').order_by('start_datetime')
 
-    recent = LessonBooking.objects.filter(
-        teacher=request.user
-    ).exclude(status='pending').select_related('student','subject').order_by('-created_at')[:20]
+        recent = LessonBooking.objects.filter(
+            teacher=request.user
+        ).exclude(status='pending').select_related('student','subject').order_by('-created_at')[:20]
+        return {
+            'pending': pending,
+            'recent': recent,
+        }
 
-    return render(request, 'core/teacher_dashboard.html', {
-        'pending': pending,
-        'recent': recent,
-    })
+    keys = [user_key(request.user.id), version_key(CATALOG)]
+    return render_versioned(request, f'teacher_dashboard:{request.user.id}', keys,
+                            'core/teacher_dashboard.html', context)
 
 
 @login_required
 def choose_subjects(request):
-    subjects = Subject.objects.all().order_by('name')
+    subjects = get_catalog()
     if request.method == 'POST':
-        # clear existing
-        UserSubject.objects.filter(user=request.user).delete()
-        # add selected
-        selected = request.POST.getlist('subjects')
-        for sid in selected:
-            UserSubject.objects.create(user=request.user, subject_id=sid)
+        try:
+            set_student_subjects(request.user, request.POST.getlist('subjects'))
+        except ValidationError as e:
+            return render(request, 'core/choose_subjects.html', {'subjects': subjects, 'error': e.messages[0]})
         return redirect('dashboard')
     return render(request, 'core/choose_subjects.html', {'subjects': subjects})
 
@@ -132,23 +155,22 @@ def logout_view(request):
     logout(request)
     return redirect('home')
 
-def is_teacher(user):
-    return user.groups.filter(name="teacher").exists()
-
 @login_required
 def teacher_subjects(request):
     if not (is_teacher(request.user) or request.user.is_staff):
         return HttpResponseForbidden("Not allowed")
 
-    all_subjects = Subject.objects.all().order_by('name')
+    all_subjects = get_catalog()
+    error = None
     if request.method == 'POST':
-        TeacherSubject.objects.filter(teacher=request.user).delete()
-        for sid in request.POST.getlist('subjects'):
-            TeacherSubject.objects.create(teacher=request.user, subject_id=sid)
-        return redirect('teacher_dashboard')
+        try:
+            set_teacher_subjects(request.user, request.POST.getlist('subjects'))
+            return redirect('teacher_dashboard')
+        except ValidationError as e:
+            error = e.messages[0]
     chosen_ids = set(TeacherSubject.objects.filter(teacher=request.user).values_list('subject_id', flat=True))
     return render(request, 'core/teacher_subjects.html', {
-        'subjects': all_subjects, 'chosen_ids': chosen_ids
+        'subjects': all_subjects, 'chosen_ids': chosen_ids, 'error': error,
     })
 
 @login_required
@@ -163,7 +185,7 @@ def teacher_tasks(request):
 def teacher_task_new(request):
     if not (is_teacher(request.user) or request.user.is_staff):
         return HttpResponseForbidden("Not allowed")
-    subjects = Subject.objects.filter(teachersubject__teacher=request.user).distinct().order_by('name')
+    subjects = get_catalog().only(request.user.teacher_subjects.values_list('subject_id', flat=True))
     if request.method == 'POST':
         s_id = request.POST.get('subject_id')
         title = request.POST.get('title')
@@ -180,32 +202,24 @@ def student_tasks(request):
         return HttpResponseForbidden("Not allowed")
 
     my_subject_ids = UserSubject.objects.filter(user=request.user).values_list('subject_id', flat=True)
+    latest_id = (Submission.objects
+                 .filter(student=request.user, task=OuterRef('pk'))
+                 .order_by('-submitted_at')
+                 .values('id')[:1])
     tasks = (Task.objects
              .filter(subject_id__in=my_subject_ids)
              .select_related('subject', 'teacher')
-             .order_by('-created_at'))
-
-    # latest submission per task (dict) AND a set of submitted task ids
-    task_ids = [t.id for t in tasks]
-    latest_by_task = {}
-    submitted_task_ids = set()
-    for s in Submission.objects.filter(student=request.user, task_id__in=task_ids).order_by('-submitted_at'):
-        if s.task_id not in latest_by_task:
-            latest_by_task[s.task_id] = {
-                "id": s.id,
-                "submitted_at": s.submitted_at,
-                "feedback_text": s.feedback_text,
-                "feedback_at": s.feedback_at,
-                "locked": s.locked,
-                "file_url": s.file.url if s.file else "",
-            }
-        submitted_task_ids.add(s.task_id)
-
-    return render(request, 'core/student_tasks.html', {
-        'tasks': tasks,
-        'latest_by_task': latest_by_task,
-        'submitted_task_ids': submitted_task_ids,   # 👈 use this in template
-    })
+             .annotate(latest_submission_id=Subquery(latest_id))
+             .order_by('-created_at', '-id'))
+    page = Paginator(tasks, TASKS_PER_PAGE).get_page(request.GET.get('page'))
+
+    # one query for the latest submission of every task on this page
+    latest = Submission.objects.in_bulk([t.latest_submission_id for t in page if t.latest_submission_id])
+    for t in page:
+        t.latest = latest.get(t.latest_submission_id)
+    attach_download_urls(latest.values())
+
+    return render(request, 'core/student_tasks.html', {'page': page, 'tasks': page.object_list})
 
 
 @login_required
@@ -214,34 +228,66 @@ def student_submit(request, task_id):
         return HttpResponseForbidden("Not allowed")
 
     task = get_object_or_404(Task.objects.select_related('subject'), id=task_id)
-
-    # only if student has this subject
-    if not UserSubject.objects.filter(user=request.user, subject=task.subject).exists():
-        return HttpResponseForbidden("This task is not for your subjects.")
-
-    # latest submission (if any)
-    latest = (Submission.objects
-              .filter(student=request.user, task=task)
-              .order_by('-submitted_at')
-              .first())
-
-    # 🚫 block if locked
-    if latest and latest.locked:
+    latest = latest_submission(request.user, task)
+    attach_download_urls([latest])
+    try:
+        check_can_submit(request.user, task, latest)
+    except SubmissionError as e:
+        if e.status_code != 409:
+            return HttpResponseForbidden(str(e))
+        # 🚫 block if locked
         return render(request, 'core/student_submit.html', {
             'task': task,
             'locked': True,
             'latest': latest,
-            'error': "This submission is locked by your teacher. You can no longer resubmit.",
+            'error': str(e),
         })
 
+    # normally the page uploads straight to storage via the API (see
+    # homework/uploads.py); this form post is the no-JavaScript fallback
     if request.method == 'POST':
         f = request.FILES.get('file')
         if not f:
             return render(request, 'core/student_submit.html', {'task': task, 'error': 'Please choose a file.'})
-        Submission.objects.create(task=task, student=request.user, file=f)
+        create_submission(task, request.user, f)
         return redirect('student_tasks')
 
-    return render(request, 'core/student_submit.html', {'task': task, 'latest': latest, 'locked': False})
+    return render(request, 'core/student_submit.html', {
+        'task': task, 'latest': latest, 'locked': False,
+        'accept': ','.join(allowed_content_types()),
+    })
+
+def _submission_inbox(request, subs):
+    """Filter ``subs`` from the query string and cut one keyset page.
+
+    Filters: ``subject``, ``task`` (ids), ``locked`` (1/0) and ``awaiting``
+    (1: no feedback yet). Returns ``(items, filters, next_url)``.
+    """
+    params = request.GET
+    filters = {}
+    for key in ('subject', 'task'):
+        if params.get(key, '').isdigit():
+            filters[key] = int(params[key])
+    if 'subject' in filters:
+        subs = subs.filter(task__subject_id=filters['subject'])
+    if 'task' in filters:
+        subs = subs.filter(task_id=filters['task'])
+    if params.get('locked') in ('0', '1'):
+        filters['locked'] = params['locked']
+        subs = subs.filter(locked=params['locked'] == '1')
+    if params.get('awaiting') == '1':
+        filters['awaiting'] = True
+        subs = subs.filter(feedback_text='')
+
+    items, next_cursor = keyset_page(subs, 'submitted_at', params.get('cursor'), SUBMISSIONS_PER_PAGE)
+    attach_download_urls(items)
+    next_url = None
+    if next_cursor:
+        query = params.copy()
+        query['cursor'] = next_cursor
+        next_url = f"?{query.urlencode()}"
+    return items, filters, next_url
+
 
 @login_required
 def teacher_submissions(request):
@@ -249,10 +295,16 @@ def teacher_submissions(request):
         return HttpResponseForbidden("Not allowed")
 
     subs = (Submission.objects
-            .filter(task__teacher=request.user)
-            .select_related('task', 'student', 'task__subject')
-            .order_by('-submitted_at'))
-    return render(request, 'core/teacher_submissions.html', {'subs': subs})
+            .filter(teacher=request.user)
+            .select_related('task', 'student', 'task__subject'))
+    try:
+        items, filters, next_url = _submission_inbox(request, subs)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    subjects = get_catalog().only(request.user.teacher_subjects.values_list('subject_id', flat=True))
+    return render(request, 'core/teacher_submissions.html', {
+        'subs': items, 'filters': filters, 'next_url': next_url, 'subjects': subjects,
+    })
 
 @login_required
 def teacher_task_submissions(request, task_id):
@@ -262,9 +314,28 @@ def teacher_task_submissions(request, task_id):
     task = get_object_or_404(Task.objects.select_related('subject'), id=task_id, teacher=request.user)
     subs = (Submission.objects
             .filter(task=task)
-            .select_related('student')
-            .order_by('-submitted_at'))
-    return render(request, 'core/teacher_task_submissions.html', {'task': task, 'subs': subs})
+            .select_related('student'))
+    try:
+        items, filters, next_url = _submission_inbox(request, subs)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+    return render(request, 'core/teacher_task_submissions.html', {
+        'task': task, 'subs': items, 'filters': filters, 'next_url': next_url,
+    })
+
+@login_required
+def teacher_task_submissions_zip(request, task_id):
+    """Latest submission per student as one streamed ZIP."""
+    if not (is_teacher(request.user) or request.user.is_staff):
+        return HttpResponseForbidden("Not allowed")
+
+    task = get_object_or_404(Task, id=task_id, teacher=request.user)
+    # under ASGI a sync iterator would be read into memory before sending
+    zip_stream = astream_zip if isinstance(request, ASGIRequest) else stream_zip
+    response = StreamingHttpResponse(zip_stream(latest_submissions(task).iterator()),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="task-{task.id}-submissions.zip"'
+    return response
 
 @login_required
 def teacher_submission_detail(request, submission_id):
@@ -280,13 +351,19 @@ def teacher_submission_detail(request, submission_id):
         return HttpResponseForbidden("Not allowed")
 
     if request.method == 'POST':
-        feedback = request.POST.get('feedback_text', '').strip()
-        lock = bool(request.POST.get('lock'))
-        sub.feedback_text = feedback
-        sub.locked = lock
-        from django.utils import timezone
-        sub.feedback_at = timezone.now() if feedback else None
-        sub.save()
+        save_feedback(sub, request.user, request.POST.get('feedback_text', '').strip(),
+                      bool(request.POST.get('lock')))
         return redirect('teacher_submissions')
 
+    attach_download_urls([sub])
     return render(request, 'core/teacher_submission_detail.html', {'sub': sub})
+
+
+@require_GET
+def internal_metrics(request):
+    """Prometheus scrape target: staff sessions, or ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = settings.METRICS_TOKEN
+    bearer = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not (request.user.is_staff or (token and hmac.compare_digest(bearer, token))):
+        return HttpResponseForbidden("Not allowed")
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,17 @@
+# gunicorn.conf.py
+"""Gunicorn settings for the ASGI entry point (tuition_project.asgi).
+
+Uvicorn workers run the async API views on one event loop per process;
+sync views still work there, each running in a thread. Set
+GUNICORN_WORKER_CLASS=sync and point gunicorn at tuition_project.wsgi to
+fall back to plain WSGI workers.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+keepalive = 5
+accesslog = "-"
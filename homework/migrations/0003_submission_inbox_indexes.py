@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0002_submission_submission_student_task_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='submission_task_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['task', '-submitted_at', '-id'], name='submission_task_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('feedback_text', '')), fields=['task', '-submitted_at', '-id'], name='submission_awaiting_idx'),
+        ),
+    ]
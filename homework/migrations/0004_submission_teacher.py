@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_task_teacher(apps, schema_editor):
+    Submission = apps.get_model('homework', 'Submission')
+    Task = apps.get_model('homework', 'Task')
+    Submission.objects.filter(teacher__isnull=True).update(
+        teacher_id=Subquery(Task.objects.filter(pk=OuterRef('task_id')).values('teacher_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0003_submission_inbox_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # the column becomes NOT NULL and indexed in 0005, in its own transaction
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='teacher',
+            field=models.ForeignKey(editable=False, null=True, on_delete=models.deletion.CASCADE,
+                                    related_name='received_submissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_task_teacher, migrations.RunPython.noop),
+    ]
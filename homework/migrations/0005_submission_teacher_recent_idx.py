@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0004_submission_teacher'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='teacher',
+            field=models.ForeignKey(editable=False, on_delete=models.deletion.CASCADE,
+                                    related_name='received_submissions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['teacher', '-submitted_at', '-id'], name='submission_teacher_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def drop_replayed_duplicates(apps, schema_editor):
+    # replayed upload confirmations left copies of one submission; keep the one
+    # with feedback if any, else the first
+    Submission = apps.get_model('homework', 'Submission')
+    dupes = (Submission.objects.values('task_id', 'student_id', 'file')
+             .annotate(n=Count('id')).filter(n__gt=1))
+    for d in dupes:
+        rows = sorted(Submission.objects.filter(task_id=d['task_id'], student_id=d['student_id'], file=d['file']),
+                      key=lambda s: (s.feedback_text == '', s.id))
+        Submission.objects.filter(pk__in=[s.pk for s in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('homework', '0005_submission_teacher_recent_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_replayed_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='submission',
+            constraint=models.UniqueConstraint(fields=('task', 'student', 'file'), name='submission_unique_file'),
+        ),
+    ]
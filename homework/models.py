@@ -1,11 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from subjects.models import Subject, UserSubject, TeacherSubject
+from subjects.models import Subject
+from core.validation import BatchValidatedModel
 
 User = get_user_model()
 
-class Task(models.Model):
+class Task(BatchValidatedModel, models.Model):
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tasks')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     title = models.CharField(max_length=200)
@@ -14,24 +15,50 @@ class Task(models.Model):
     due_dt = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', '-created_at'], name='task_subject_created_idx'),
+            models.Index(fields=['teacher', '-created_at'], name='task_teacher_created_idx'),
+        ]
+
     def clean(self):
+        ctx = self.validation_context()
         # only teachers; teacher must teach this subject
-        if self.teacher and not self.teacher.groups.filter(name='teacher').exists():
+        if self.teacher_id and not ctx.is_teacher(self.teacher_id):
             raise ValidationError({'teacher': 'Only teachers can create tasks.'})
         if self.teacher_id and self.subject_id:
-            if not TeacherSubject.objects.filter(teacher_id=self.teacher_id, subject_id=self.subject_id).exists():
+            if not ctx.teaches(self.teacher_id, self.subject_id):
                 raise ValidationError({'subject': 'You have not selected this subject.'})
 
+    # teacher_id as last loaded or saved, so save() can tell when the task changes hands
+    _saved_teacher_id = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        task = super().from_db(db, field_names, values)
+        task._saved_teacher_id = task.__dict__.get('teacher_id')
+        return task
+
     def save(self, *args, **kwargs):
-        self.full_clean()
-        return super().save(*args, **kwargs)
+        if self.pk is None or self._saved_teacher_id == self.teacher_id:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                # Submission.teacher is a copy; move the inbox along with the task
+                self.submissions.update(teacher_id=self.teacher_id)
+        self._saved_teacher_id = self.teacher_id
 
     def __str__(self):
         return f"{self.title} ({self.subject.name})"
 
-class Submission(models.Model):
+class Submission(BatchValidatedModel, models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions')
+    # copied from task.teacher so the cross-task inbox is one index range;
+    # Task.save() rewrites it when a task is reassigned
+    teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='received_submissions',
+                                editable=False)
     file = models.FileField(upload_to='submissions/')
     submitted_at = models.DateTimeField(auto_now_add=True)
 
@@ -40,13 +67,30 @@ class Submission(models.Model):
     feedback_at = models.DateTimeField(null=True, blank=True)
     locked = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # latest submission per (student, task)
+            models.Index(fields=['student', 'task', '-submitted_at'], name='submission_student_task_idx'),
+            # teacher inbox, keyset on (submitted_at, id); the partial one serves "awaiting feedback"
+            models.Index(fields=['task', '-submitted_at', '-id'], name='submission_task_recent_idx'),
+            models.Index(fields=['task', '-submitted_at', '-id'], condition=models.Q(feedback_text=''),
+                         name='submission_awaiting_idx'),
+            # every task's submissions for one teacher, newest first
+            models.Index(fields=['teacher', '-submitted_at', '-id'], name='submission_teacher_recent_idx'),
+        ]
+        constraints = [
+            # a stored file is submitted once; replaying an upload confirmation can't add another
+            models.UniqueConstraint(fields=['task', 'student', 'file'], name='submission_unique_file'),
+        ]
+
     def clean(self):
+        ctx = self.validation_context()
         errors = {}
         # student must be a student and must have selected the subject
-        if self.student and self.student.groups.filter(name='teacher').exists():
+        if self.student_id and ctx.is_teacher(self.student_id):
             errors['student'] = 'Only students can submit.'
         if self.task_id and self.student_id:
-            if not UserSubject.objects.filter(user_id=self.student_id, subject_id=self.task.subject_id).exists():
+            if not ctx.studies(self.student_id, ctx.task_subject_id(self.task_id)):
                 errors['file'] = 'You have not selected this task’s subject.'
         # cannot lock without feedback
         if self.locked and not self.feedback_text:
@@ -55,7 +99,8 @@ class Submission(models.Model):
             raise ValidationError(errors)
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        if self.teacher_id is None and self.task_id is not None:
+            self.teacher_id = self.task.teacher_id
         return super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,74 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from subjects.models import UserSubject
+from core.outbox import enqueue
+from core.roles import is_student
+
+from .models import Submission
+
+_UNSET = object()
+
+
+class SubmissionError(Exception):
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+def latest_submission(student, task):
+    return (Submission.objects
+            .filter(student=student, task=task)
+            .order_by('-submitted_at')
+            .first())
+
+
+def check_can_submit(student, task, latest=_UNSET):
+    """Raise ``SubmissionError`` unless ``student`` may (re)submit ``task``.
+
+    Pass ``latest`` if the caller already loaded the student's latest submission.
+    """
+    if not is_student(student):
+        raise SubmissionError("Not allowed", 403)
+    if not UserSubject.objects.filter(user=student, subject_id=task.subject_id).exists():
+        raise SubmissionError("This task is not for your subjects.", 403)
+    if latest is _UNSET:
+        latest = latest_submission(student, task)
+    if latest and latest.locked:
+        raise SubmissionError("This submission is locked by your teacher. You can no longer resubmit.", 409)
+
+
+def create_submission(task, student, file):
+    """Save a new submission and queue its receipt and audit record in the same transaction."""
+    with transaction.atomic():
+        sub = Submission.objects.create(task=task, student=student, file=file)
+        enqueue('submission.created', submission=sub.pk)
+    return sub
+
+
+def submit_upload(task, student, name):
+    """``create_submission`` for a file already in storage; returns ``(submission, created)``.
+
+    Confirming the same upload again returns the submission it created the
+    first time, without queueing another receipt.
+    """
+    try:
+        return create_submission(task, student, name), True
+    except IntegrityError:
+        existing = Submission.objects.filter(task=task, student=student, file=name).first()
+        if existing is None:
+            raise
+        return existing, False
+
+
+def save_feedback(sub, teacher, feedback, lock):
+    """Set the teacher's feedback and lock flag; the student hears about it from the outbox."""
+    sub.feedback_text = feedback
+    sub.locked = lock
+    sub.feedback_at = timezone.now() if feedback else None
+    with transaction.atomic():
+        sub.save()
+        enqueue('submission.feedback', submission=sub.pk, actor=teacher.pk)
@@ -1,3 +1,288 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import tracemalloc
+import zipfile
+from datetime import timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from core.models import OutboxMessage
+from subjects.models import Subject, TeacherSubject, UserSubject
+
+from .export import CHUNK_SIZE
+from .models import Submission, Task
+
+MEDIA = tempfile.mkdtemp()
+
+LOCAL_UPLOADS = dict(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": MEDIA}},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    },
+    SUBMISSION_UPLOAD_BACKEND="homework.uploads.LocalPresignedUploads",
+    SUBMISSION_UPLOAD_MAX_BYTES=1024,
+)
+
+
+class TaskValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        cls.subject = Subject.objects.create(code="BIO", name="Biology")
+        cls.other_subject = Subject.objects.create(code="CHEM", name="Chemistry")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=cls.subject)
+
+    def test_form_posted_subject_id_is_validated(self):
+        # form input is a string; it must match the teacher's integer subject ids
+        self.client.force_login(self.teacher)
+        response = self.client.post(reverse("teacher_task_new"),
+                                    {"subject_id": str(self.subject.id), "title": "Cells"})
+        self.assertRedirects(response, reverse("teacher_tasks"), fetch_redirect_response=False)
+        self.assertEqual(Task.objects.get().subject, self.subject)
+
+    def test_subject_not_taught_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            Task(teacher=self.teacher, subject_id=str(self.other_subject.id), title="Acids").save()
+        with self.assertRaises(ValidationError):
+            Task(teacher=self.teacher, subject_id="not-a-number", title="Acids").save()
+
+    def test_reassigning_a_task_moves_its_submissions(self):
+        cover = User.objects.create_user("cover", password="x")
+        cover.groups.add(Group.objects.get(name="teacher"))
+        TeacherSubject.objects.create(teacher=cover, subject=self.subject)
+        student = User.objects.create_user("student", password="x")
+        student.groups.add(Group.objects.get_or_create(name="student")[0])
+        UserSubject.objects.create(user=student, subject=self.subject)
+        task = Task.objects.create(teacher=self.teacher, subject=self.subject, title="Cells")
+        sub = Submission.objects.create(task=task, student=student, file="cells.pdf")
+
+        task = Task.objects.get(pk=task.pk)
+        task.teacher = cover
+        task.save()
+        self.assertEqual(Submission.objects.get(pk=sub.pk).teacher_id, cover.id)
+        for teacher, expected in ((self.teacher, []), (cover, [sub.pk])):
+            self.client.force_login(teacher)
+            response = self.client.get(reverse("teacher_submissions"))
+            self.assertEqual([s.pk for s in response.context["subs"]], expected)
+
+
+class SubmissionInboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        subject = Subject.objects.create(code="BIO", name="Biology")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=subject)
+        student = User.objects.create_user("student", password="x")
+        student.groups.add(Group.objects.get_or_create(name="student")[0])
+        UserSubject.objects.create(user=student, subject=subject)
+        task = Task.objects.create(teacher=cls.teacher, subject=subject, title="Cells")
+        cls.reviewed = Submission.objects.create(task=task, student=student, file="a.pdf", feedback_text="Good")
+        cls.awaiting = Submission.objects.create(task=task, student=student, file="b.pdf")
+
+    def inbox(self, **params):
+        self.client.force_login(self.teacher)
+        return {s.pk for s in self.client.get(reverse("teacher_submissions"), params).context["subs"]}
+
+    def test_awaiting_filter_only_applies_when_checked(self):
+        everything = {self.reviewed.pk, self.awaiting.pk}
+        self.assertEqual(self.inbox(awaiting="1"), {self.awaiting.pk})
+        for off in ("0", "false", ""):
+            with self.subTest(awaiting=off):
+                self.assertEqual(self.inbox(awaiting=off), everything)
+
+
+@override_settings(**LOCAL_UPLOADS)
+class PresignedUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user("teacher", password="x")
+        teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        cls.student = User.objects.create_user("student", password="x")
+        cls.student.groups.add(Group.objects.get_or_create(name="student")[0])
+        cls.other = User.objects.create_user("other", password="x")
+        cls.other.groups.add(Group.objects.get_or_create(name="student")[0])
+        subject = Subject.objects.create(code="BIO", name="Biology")
+        TeacherSubject.objects.create(teacher=teacher, subject=subject)
+        UserSubject.objects.create(user=cls.student, subject=subject)
+        UserSubject.objects.create(user=cls.other, subject=subject)
+        cls.task = Task.objects.create(teacher=teacher, subject=subject, title="Cells")
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.student)
+
+    def target(self, content_type="application/pdf", **extra):
+        body = {"filename": "../my essay.pdf", "content_type": content_type, **extra}
+        return self.client.post(reverse("api_submission_upload_target", args=[self.task.id]),
+                                body, content_type="application/json")
+
+    def upload(self, target, data=b"%PDF-1.4 hello", content_type=None):
+        fields = dict(target["fields"])
+        if content_type:
+            fields["Content-Type"] = content_type
+        fields["file"] = SimpleUploadedFile("x.pdf", data)
+        return self.client.post(target["url"], fields)
+
+    def confirm(self, ticket):
+        return self.client.post(reverse("api_confirm_submission", args=[self.task.id]),
+                                {"ticket": ticket}, content_type="application/json")
+
+    def test_upload_then_confirm_creates_submission(self):
+        target = self.target().json()
+        key = target["fields"]["key"]
+        self.assertTrue(key.startswith(f"submissions/{self.task.id}/{self.student.id}/"))
+        self.assertTrue(key.endswith("/my_essay.pdf"))
+        self.assertFalse(Submission.objects.exists())
+
+        self.assertEqual(self.upload(target).status_code, 204)
+        self.assertFalse(Submission.objects.exists())
+
+        response = self.confirm(target["ticket"])
+        self.assertEqual(response.status_code, 201)
+        sub = Submission.objects.get()
+        self.assertEqual(sub.file.name, key)
+        self.assertEqual(sub.teacher_id, self.task.teacher_id)
+        self.assertEqual(sub.file.read(), b"%PDF-1.4 hello")
+
+    def test_confirming_a_ticket_twice_returns_the_same_submission(self):
+        target = self.target().json()
+        self.upload(target)
+        first = self.confirm(target["ticket"])
+        self.assertEqual(first.status_code, 201)
+        again = self.confirm(target["ticket"])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()["id"], first.json()["id"])
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(kind="submission.created").count(), 1)
+
+    def test_rejects_disallowed_type_and_oversized_files(self):
+        self.assertEqual(self.target(content_type="text/html").status_code, 400)
+        self.assertEqual(self.target(size=4096).status_code, 400)
+        target = self.target().json()
+        self.assertEqual(self.upload(target, data=b"x" * 2048).status_code, 400)
+        self.assertEqual(self.upload(target, content_type="image/png").status_code, 400)
+
+    def test_confirm_requires_the_uploaded_object(self):
+        target = self.target().json()
+        self.assertEqual(self.confirm(target["ticket"]).status_code, 400)
+        self.assertEqual(self.confirm("forged").status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_ticket_is_scoped_to_task_and_student(self):
+        target = self.target().json()
+        self.upload(target)
+        self.client.force_login(self.other)
+        self.assertEqual(self.confirm(target["ticket"]).status_code, 400)
+        self.assertFalse(Submission.objects.exists())
+
+    def test_locked_submission_blocks_new_uploads(self):
+        Submission.objects.create(task=self.task, student=self.student, file="old.pdf",
+                                  feedback_text="Good", locked=True)
+        self.assertEqual(self.target().status_code, 409)
+
+
+@override_settings(**LOCAL_UPLOADS)
+class ZipExportTests(TestCase):
+    FILE_SIZE = 3 * 1024 * 1024
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", password="x")
+        cls.teacher.groups.add(Group.objects.get_or_create(name="teacher")[0])
+        subject = Subject.objects.create(code="CHEM", name="Chemistry")
+        TeacherSubject.objects.create(teacher=cls.teacher, subject=subject)
+        cls.task = Task.objects.create(teacher=cls.teacher, subject=subject, title="Reactions")
+        student_group = Group.objects.get_or_create(name="student")[0]
+        cls.students = []
+        for i in range(4):
+            student = User.objects.create_user(f"student{i}", password="x")
+            student.groups.add(student_group)
+            UserSubject.objects.create(user=student, subject=subject)
+            cls.students.append(student)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA, ignore_errors=True)
+
+    def submit(self, student, name, data, days_ago=0):
+        stored = default_storage.save(f"submissions/{name}", ContentFile(data))
+        sub = Submission.objects.create(task=self.task, student=student, file=stored)
+        Submission.objects.filter(pk=sub.pk).update(submitted_at=sub.submitted_at - timedelta(days=days_ago))
+        return sub
+
+    async def asubmit(self, student, name, data):
+        return await sync_to_async(self.submit)(student, name, data)
+
+    def download(self):
+        self.client.force_login(self.teacher)
+        return self.client.get(reverse("teacher_task_submissions_zip", args=[self.task.id]))
+
+    def test_zip_holds_latest_submission_per_student(self):
+        self.submit(self.students[0], "old.pdf", b"old", days_ago=2)
+        self.submit(self.students[0], "new.pdf", b"new")
+        self.submit(self.students[1], "photo.JPG", b"jpg")
+        response = self.download()
+        self.assertEqual(response["Content-Type"], "application/zip")
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        names = archive.namelist()
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[0].startswith("student0_") and names[0].endswith(".pdf"))
+        self.assertTrue(names[1].startswith("student1_") and names[1].endswith(".jpg"))
+        self.assertEqual(archive.read(names[0]), b"new")
+
+    def test_missing_files_are_listed_not_fatal(self):
+        self.submit(self.students[0], "here.pdf", b"here")
+        gone = self.submit(self.students[1], "gone.pdf", b"gone")
+        default_storage.delete(gone.file.name)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(self.download().streaming_content)))
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertIn(gone.file.name, archive.read("MISSING.txt").decode())
+
+    def test_memory_stays_bounded(self):
+        for student in self.students:
+            self.submit(student, f"{student.username}.pdf", bytes(self.FILE_SIZE))
+        response = self.download()
+
+        total = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                total += len(chunk)
+                self.assertLessEqual(len(chunk), CHUNK_SIZE + 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(total, len(self.students) * self.FILE_SIZE)
+        # a handful of chunks in flight, not the 12 MB archive
+        self.assertLess(peak, 16 * CHUNK_SIZE)
+
+    async def test_streams_under_asgi(self):
+        for student in self.students:
+            await self.asubmit(student, f"{student.username}.pdf", bytes(self.FILE_SIZE))
+        client = AsyncClient()
+        await client.aforce_login(self.teacher)
+        response = await client.get(reverse("teacher_task_submissions_zip", args=[self.task.id]))
+        self.assertTrue(response.is_async)
+
+        chunks = []
+        async for chunk in response.streaming_content:
+            self.assertLessEqual(len(chunk), CHUNK_SIZE + 1024)
+            chunks.append(chunk)
+        self.assertGreater(len(chunks), len(self.students))
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+        self.assertEqual(len(archive.namelist()), len(self.students))
@@ -0,0 +1,204 @@
+"""Direct-to-storage submission uploads.
+
+The browser asks for an upload target, POSTs the file straight to storage,
+then confirms; only the confirm step touches the database. Two backends
+share one interface:
+
+* ``S3PresignedUploads`` signs an S3 POST policy for the default
+  ``S3Boto3Storage`` and HEADs the object on confirm.
+* ``LocalPresignedUploads`` is the offline stand-in: the "presigned" target
+  is ``api_local_upload``, which checks a signed token the same way S3 checks
+  its policy, and writes to the default (filesystem) storage.
+"""
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+TICKET_SALT = "homework.uploads.ticket"
+LOCAL_TOKEN_SALT = "homework.uploads.local"
+
+DEFAULT_CONTENT_TYPES = (
+    "application/pdf",
+    "application/msword",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "image/png",
+    "image/jpeg",
+)
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+def max_bytes():
+    return getattr(settings, "SUBMISSION_UPLOAD_MAX_BYTES", 20 * 1024 * 1024)
+
+
+def allowed_content_types():
+    return tuple(getattr(settings, "SUBMISSION_UPLOAD_CONTENT_TYPES", DEFAULT_CONTENT_TYPES))
+
+
+def expires_in():
+    return getattr(settings, "SUBMISSION_UPLOAD_EXPIRES", 600)
+
+
+def upload_prefix(task_id, student_id):
+    return f"submissions/{task_id}/{student_id}/"
+
+
+def upload_name(task_id, student_id, filename):
+    """Storage name for a new upload: unique, and scoped to the task and student."""
+    base = get_valid_filename(os.path.basename(filename or ""))[-100:] or "upload"
+    return f"{upload_prefix(task_id, student_id)}{uuid.uuid4().hex}/{base}"
+
+
+def make_ticket(task_id, student_id, name, content_type):
+    return signing.dumps({"task": task_id, "student": student_id, "name": name, "type": content_type},
+                         salt=TICKET_SALT)
+
+
+def read_ticket(ticket, task_id, student_id):
+    """The ``(name, content_type)`` a ticket was issued for; raises ``UploadError``."""
+    try:
+        data = signing.loads(ticket or "", salt=TICKET_SALT, max_age=expires_in() * 2)
+    except signing.BadSignature:
+        raise UploadError("Upload ticket is invalid or has expired.")
+    if (data.get("task"), data.get("student")) != (task_id, student_id):
+        raise UploadError("Upload ticket does not belong to this task.")
+    if not data["name"].startswith(upload_prefix(task_id, student_id)):
+        raise UploadError("Upload ticket does not belong to this task.")
+    return data["name"], data["type"]
+
+
+class S3PresignedUploads:
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    @property
+    def client(self):
+        return self.storage.connection.meta.client
+
+    def key(self, name):
+        return self.storage._normalize_name(name)
+
+    def presign(self, name, content_type, limit):
+        """``{"url": ..., "fields": {...}}`` for a multipart POST of ``name``."""
+        return self.client.generate_presigned_post(
+            Bucket=self.storage.bucket_name,
+            Key=self.key(name),
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, limit]],
+            ExpiresIn=expires_in(),
+        )
+
+    def head(self, name):
+        """``(size, content_type)`` of the stored object, or ``None`` if it is missing."""
+        from botocore.exceptions import ClientError
+
+        try:
+            obj = self.client.head_object(Bucket=self.storage.bucket_name, Key=self.key(name))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return obj["ContentLength"], obj.get("ContentType", "")
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+
+class LocalPresignedUploads:
+    """Filesystem stand-in with the same presign/head interface as S3.
+
+    The content type the client declared is kept in a small sidecar file, as
+    S3 keeps it in object metadata.
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage or default_storage
+
+    @staticmethod
+    def _meta_name(name):
+        return f"{name}.meta.json"
+
+    def presign(self, name, content_type, limit):
+        token = signing.dumps({"key": name, "type": content_type, "max": limit}, salt=LOCAL_TOKEN_SALT)
+        return {
+            "url": reverse("api_local_upload"),
+            "fields": {"key": name, "Content-Type": content_type, "token": token},
+        }
+
+    def accept(self, token, key, content_type, upload):
+        """Store ``upload`` if it matches the token's policy; raises ``UploadError``."""
+        try:
+            policy = signing.loads(token or "", salt=LOCAL_TOKEN_SALT, max_age=expires_in())
+        except signing.BadSignature:
+            raise UploadError("Upload policy is invalid or has expired.")
+        if key != policy["key"] or content_type != policy["type"]:
+            raise UploadError("Upload does not match its policy.")
+        if upload is None or not 1 <= upload.size <= policy["max"]:
+            raise UploadError("File size is outside the allowed range.")
+        self.storage.delete(key)
+        self.storage.save(key, upload)
+        self.storage.delete(self._meta_name(key))
+        self.storage.save(self._meta_name(key), ContentFile(json.dumps({"type": content_type})))
+
+    def head(self, name):
+        if not self.storage.exists(name):
+            return None
+        content_type = ""
+        if self.storage.exists(self._meta_name(name)):
+            with self.storage.open(self._meta_name(name)) as f:
+                content_type = json.load(f).get("type", "")
+        return self.storage.size(name), content_type
+
+    def delete(self, name):
+        self.storage.delete(name)
+        self.storage.delete(self._meta_name(name))
+
+
+def get_backend():
+    path = getattr(settings, "SUBMISSION_UPLOAD_BACKEND", "homework.uploads.S3PresignedUploads")
+    return import_string(path)()
+
+
+def start_upload(task, student, filename, content_type, size=None):
+    """Issue an upload target plus the ticket that confirms it later."""
+    if content_type not in allowed_content_types():
+        raise UploadError("This file type is not allowed.")
+    limit = max_bytes()
+    if size is not None and not 0 < size <= limit:
+        raise UploadError(f"Files must be at most {limit // (1024 * 1024)} MB.")
+    name = upload_name(task.pk, student.pk, filename)
+    target = get_backend().presign(name, content_type, limit)
+    return {
+        "url": target["url"],
+        "fields": target["fields"],
+        "ticket": make_ticket(task.pk, student.pk, name, content_type),
+        "expires_in": expires_in(),
+    }
+
+
+def verify_upload(task, student, ticket):
+    """HEAD the uploaded object against the ticket; returns its storage name.
+
+    Objects that fail the size or type check are deleted.
+    """
+    name, content_type = read_ticket(ticket, task.pk, student.pk)
+    backend = get_backend()
+    found = backend.head(name)
+    if found is None:
+        raise UploadError("No uploaded file was found; upload it first.")
+    size, stored_type = found
+    if not 0 < size <= max_bytes() or stored_type != content_type or stored_type not in allowed_content_types():
+        backend.delete(name)
+        raise UploadError("The uploaded file failed the size or type check.")
+    return name
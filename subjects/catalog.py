@@ -0,0 +1,92 @@
+"""Cached subject catalog.
+
+The Subject table changes only when ``seed_subjects`` runs or an admin
+edits it, so the whole catalog is kept in process memory and in the shared
+cache. Freshness is checked against the catalog version in
+``core.versions``, which Subject save/delete signals bump: a warm request
+costs one cache read and no queries. Without a shared cache there are no
+bumps; the worker that saved a subject drops its own copy, and other
+workers reload after ``LOCAL_TIMEOUT``.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import versions
+
+from .models import Subject
+
+CACHE_KEY = "subjects:catalog"
+# without a shared cache another worker's bump is invisible, so bound the staleness
+LOCAL_TIMEOUT = getattr(settings, "SUBJECT_CATALOG_LOCAL_TIMEOUT", 60)
+
+CatalogSubject = namedtuple("CatalogSubject", "id code name")
+
+
+class Catalog:
+    def __init__(self, subjects):
+        self.subjects = tuple(subjects)
+        self.by_id = {s.id: s for s in self.subjects}
+        payload = json.dumps(self.as_list(), separators=(",", ":"))
+        self.etag = '"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def __iter__(self):
+        return iter(self.subjects)
+
+    def __len__(self):
+        return len(self.subjects)
+
+    def as_list(self):
+        return [s._asdict() for s in self.subjects]
+
+    def only(self, ids):
+        """Subjects whose id is in ``ids``, still ordered by name."""
+        ids = set(ids)
+        return [s for s in self.subjects if s.id in ids]
+
+
+_process = {"token": None, "catalog": None, "loaded_at": 0.0}
+_lock = threading.Lock()
+
+
+def _load():
+    rows = Subject.objects.order_by("name", "id").values_list("id", "code", "name")
+    return Catalog(CatalogSubject(*row) for row in rows)
+
+
+def get_catalog():
+    """The current catalog, ordered by name."""
+    version_key = versions.version_key(versions.CATALOG)
+    (token,), _ = versions.current_versions([version_key])
+    with _lock:
+        fresh = _process["token"] == token and (
+            versions.enabled() or time.monotonic() - _process["loaded_at"] < LOCAL_TIMEOUT)
+        if fresh:
+            return _process["catalog"]
+
+    entry = cache.get(CACHE_KEY)
+    if entry is not None and entry[0] == token and versions.enabled():
+        catalog = entry[1]
+    else:
+        catalog = _load()
+        cache.set(CACHE_KEY, (token, catalog), None)
+    with _lock:
+        _process.update(token=token, catalog=catalog, loaded_at=time.monotonic())
+    return catalog
+
+
+def clear_local():
+    with _lock:
+        _process.update(token=None, catalog=None, loaded_at=0.0)
+
+
+@receiver([post_save, post_delete], sender=Subject)
+def _subject_changed(sender, **kwargs):
+    clear_local()
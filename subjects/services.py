@@ -0,0 +1,52 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core.versions import bump_users
+
+from .models import Subject, TeacherSubject, UserSubject
+
+
+def clean_subject_ids(raw_ids):
+    """Coerce submitted ids to ints and check they all exist, in one query."""
+    if raw_ids is None:
+        raw_ids = []
+    if isinstance(raw_ids, (str, int)):
+        raw_ids = [raw_ids]
+    try:
+        ids = {int(sid) for sid in raw_ids}
+    except (TypeError, ValueError):
+        raise ValidationError("Subject ids must be integers.")
+    known = set(Subject.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+    unknown = ids - known
+    if unknown:
+        raise ValidationError(f"Unknown subject ids: {', '.join(map(str, sorted(unknown)))}")
+    return ids
+
+
+def _sync_selection(model, owner_field, owner, raw_ids):
+    wanted = clean_subject_ids(raw_ids)
+    with transaction.atomic():
+        rows = model.objects.filter(**{owner_field: owner})
+        current = set(rows.values_list('subject_id', flat=True))
+        to_remove = current - wanted
+        to_add = wanted - current
+        if to_remove:
+            rows.filter(subject_id__in=to_remove).delete()
+        if to_add:
+            model.objects.bulk_create(
+                [model(**{owner_field: owner, 'subject_id': sid}) for sid in to_add],
+                ignore_conflicts=True,
+            )
+            # bulk_create sends no post_save
+            bump_users(owner.pk)
+    return to_add, to_remove
+
+
+def set_student_subjects(user, subject_ids):
+    """Make ``user``'s UserSubject rows match ``subject_ids``; returns (added, removed) ids."""
+    return _sync_selection(UserSubject, 'user', user, subject_ids)
+
+
+def set_teacher_subjects(teacher, subject_ids):
+    """Make ``teacher``'s TeacherSubject rows match ``subject_ids``; returns (added, removed) ids."""
+    return _sync_selection(TeacherSubject, 'teacher', teacher, subject_ids)
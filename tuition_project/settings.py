@@ -61,11 +61,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryMetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     "django.middleware.security.SecurityMiddleware",
@@ -97,18 +100,67 @@ WSGI_APPLICATION = 'tuition_project.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 import dj_database_url
-import os
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'postgres',         # The "Initial database name" you typed earlier
-        'USER': 'postgres',          # The "Master username" (usually postgres)
-        'PASSWORD': os.getenv('DB_PASSWORD'), # The password you wrote down earlier!
-        'HOST': 'epl-tutors-db.cbg0ek00c38s.eu-north-1.rds.amazonaws.com', # e.g. epl-tutors.xxxx.rds.amazonaws.com
-        'PORT': '5432',
+# DATABASE_URL overrides the RDS primary below, e.g. for local runs:
+#   DATABASE_URL=sqlite:///db.sqlite3
+#   DATABASE_URL=postgres://app:pw@localhost:5432/tuition
+# DATABASE_REPLICA_URLS is a comma-separated list of read replicas; GET
+# requests read from them (core/db_router.py). Pointing a replica at the
+# primary's own URL is a zero-lag replica for trying the setup locally.
+# PostgreSQL goes through psycopg 3 (requirements.txt); Django prefers it
+# when both drivers are installed, so psycopg2 is no longer shipped.
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', '60'))
+# psycopg connection pool per worker process (PostgreSQL only); 0 keeps
+# Django's persistent per-thread connections instead.
+DATABASE_POOL_MAX_SIZE = int(os.getenv('DATABASE_POOL_MAX_SIZE', '0'))
+DATABASE_POOL_MIN_SIZE = int(os.getenv('DATABASE_POOL_MIN_SIZE', '2'))
+
+
+def _database(url):
+    db = dj_database_url.parse(url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=True)
+    if db['ENGINE'] == 'django.db.backends.sqlite3' and db['NAME'] != ':memory:':
+        # test on a file next to the database rather than in memory, so the
+        # concurrent booking tests can share it across threads
+        name = Path(db['NAME'])
+        db['TEST'] = {'NAME': str(name.with_name(f'test_{name.name}'))}
+    return _pooled(db)
+
+
+def _pooled(db):
+    if DATABASE_POOL_MAX_SIZE and db['ENGINE'] == 'django.db.backends.postgresql':
+        db['CONN_MAX_AGE'] = 0  # the pool owns connection lifetime
+        db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': min(DATABASE_POOL_MIN_SIZE, DATABASE_POOL_MAX_SIZE),
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            'timeout': 10,
+        }
+    return db
+
+
+if os.getenv('DATABASE_URL'):
+    DATABASES = {'default': _database(os.environ['DATABASE_URL'])}
+else:
+    DATABASES = {
+        'default': _pooled({
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': 'postgres',         # The "Initial database name" you typed earlier
+            'USER': 'postgres',          # The "Master username" (usually postgres)
+            'PASSWORD': os.getenv('DB_PASSWORD'), # The password you wrote down earlier!
+            'HOST': 'epl-tutors-db.cbg0ek00c38s.eu-north-1.rds.amazonaws.com', # e.g. epl-tutors.xxxx.rds.amazonaws.com
+            'PORT': '5432',
+            'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        })
     }
-}
+
+REPLICA_DATABASES = []
+for _i, _url in enumerate(u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()):
+    _alias = f'replica_{_i + 1}'
+    DATABASES[_alias] = dict(_database(_url), TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(_alias)
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# how long reads stay on the primary after a user writes; keep above replica lag
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', '5'))
 
 
 # Password validation
@@ -134,12 +186,20 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        'api.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
 
+# Bearer tokens for API clients (api/authentication.py). The first key signs
+# and every key verifies: rotate by prepending a new key, then drop the old
+# one once API_REFRESH_TOKEN_SECONDS have passed. Empty uses SECRET_KEY.
+API_TOKEN_KEYS = [k for k in os.getenv('API_TOKEN_KEYS', '').split(',') if k]
+API_ACCESS_TOKEN_SECONDS = 900
+API_REFRESH_TOKEN_SECONDS = 14 * 24 * 3600
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Tuition Platform API',
     'DESCRIPTION': 'Minimal API for subjects and onboarding',
@@ -168,6 +228,58 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Shared cache. Versioned page caching (core/versions.py) needs every worker
+# to see the same version counters, so it is only on with Redis configured.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+VERSIONED_CACHE_ENABLED = bool(REDIS_URL)
+# Role names per user (core/roles.py); without Redis they are looked up once per request.
+ROLE_CACHE_ENABLED = bool(REDIS_URL)
+# Sessions and signed-in users are read from the cache and written through to
+# the database (core/auth_backends.py). For the same reason, only with Redis.
+if REDIS_URL:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+USER_CACHE_ENABLED = bool(REDIS_URL)
+USER_CACHE_TIMEOUT = 300  # seconds; saves to the user row drop the entry
+# sessions record the backend that signed them in; ModelBackend stays listed
+# so sessions created before CachedModelBackend aren't logged out
+AUTHENTICATION_BACKENDS = [
+    'core.auth_backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+PAGE_CACHE_TIMEOUT = 3600  # seconds; entries are invalidated by version, this just bounds memory
+
+# Query count / DB time per view (core/query_metrics.py), scraped from
+# /internal/metrics by staff or with METRICS_TOKEN as a bearer token.
+QUERY_METRICS_SAMPLE_RATE = float(os.getenv('QUERY_METRICS_SAMPLE_RATE', '0.1'))  # 0 turns it off
+QUERY_METRICS_N_PLUS_ONE_THRESHOLD = 10  # same query shape this many times in one request
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Notifications are sent by `manage.py run_outbox_worker` (core/outbox.py), not
+# in the request. The console backend prints them; for a local file transport use
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'EPL Tutors <no-reply@epltutors.com>')
+
+# Weekly availability cut into slots for the next N weeks (bookings/slots.py);
+# `manage.py materialize_slots` rolls the horizon forward daily from cron
+# (.ebextensions/01_materialize_slots.config).
+AVAILABILITY_SLOT_WEEKS = 8
+AVAILABILITY_SLOT_MINUTES = 60
+
+# Submission files go straight from the browser to storage (homework/uploads.py).
+# Use 'homework.uploads.LocalPresignedUploads' with a filesystem default storage.
+SUBMISSION_UPLOAD_BACKEND = 'homework.uploads.S3PresignedUploads'
+SUBMISSION_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+SUBMISSION_UPLOAD_EXPIRES = 600  # seconds
+
 # AWS S3 SETTINGS
 AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')